@@ -17,12 +17,16 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 from alx_backend_graphql_crm import schema
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView, document_cache_stats, export_view, field_stats_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema.schema))),
+    path("graphql", csrf_exempt(CRMGraphQLView.as_view(graphiql=True, schema=schema.schema))),
+    path("graphql/async", csrf_exempt(AsyncCRMGraphQLView.as_view(schema=schema.schema))),
+    path("graphql/document-cache", document_cache_stats),
+    path("graphql/field-stats", field_stats_view),
+    path("export/<str:kind>.<str:fmt>", export_view),
 ]
 
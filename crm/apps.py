@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def install_search(sender, using, **kwargs):
+    # Puts back search triggers that a table rebuild dropped (see crm/search.py).
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+
+    from . import search
+
+    connection = connections[using]
+    if ('crm', '0009_search_index') in MigrationRecorder(connection).applied_migrations():
+        search.install(connection)
 
 
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search, sender=self)
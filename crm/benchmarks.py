@@ -0,0 +1,207 @@
+"""
+Benchmarks for the GraphQL endpoint's hot operations.
+
+Each operation is posted through ``CRMGraphQLView`` in-process (no server,
+no network) against a ``create_dataset`` dataset of the requested size,
+inside a transaction that is rolled back afterwards. Timings come from
+the plain runs; SQL counts and peak memory from one extra instrumented
+run each, so neither instrument skews the latencies.
+"""
+import json
+import time
+import tracemalloc
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from .caching import resolver_cache
+from .factories import create_dataset
+from .models import Customer, Product
+from .schema import schema
+from .tracing import percentile
+from .views import CRMGraphQLView
+
+CREATE_ORDER = """
+mutation($customerId: ID!, $productIds: [ID]!) {
+  createOrder(customerId: $customerId, productIds: $productIds) { order { id totalAmount } message }
+}
+"""
+
+BULK_CREATE_CUSTOMERS = """
+mutation($input: [CustomerInput]!) {
+  bulkCreateCustomers(input: $input) { customers { id } errors }
+}
+"""
+
+UPDATE_LOW_STOCK = """
+mutation { updateLowStockProducts(threshold: 10, increment: 1) { updatedProducts } }
+"""
+
+CUSTOMERS = """
+{ customers(first: 100) { edges { node { name email orderSet { totalAmount products { name } } } } } }
+"""
+
+ORDERS = """
+{ orders(first: 100) { edges { node { orderDate totalAmount customer { name } products { name price } } } } }
+"""
+
+
+class Operation:
+    def __init__(self, name, query, variables=None, batch=1, succeeded=None, setup=None):
+        self.name = name
+        self.query = query
+        self.variables = variables or (lambda context, i: {})
+        # Records handled per call, for rows/sec on bulk operations.
+        self.batch = batch
+        # Payload check for mutations that report failure in their data rather than as errors.
+        self.succeeded = succeeded or (lambda data: True)
+        # Called with the context and the call numbers about to run, outside the timings.
+        self.setup = setup
+
+
+def _create_order_variables(context, i):
+    products = context['products']
+    return {
+        'customerId': context['customers'][i % len(context['customers'])],
+        'productIds': [products[(i + k) % len(products)] for k in range(3)],
+    }
+
+
+def _stock_orders(context, calls):
+    # Add exactly the units the coming createOrder calls take, so none is
+    # refused and the stock levels other operations see are unchanged.
+    needed = Counter(pk for i in calls for pk in _create_order_variables(context, i)['productIds'])
+    for pk, n in needed.items():
+        Product.objects.filter(pk=pk).update(stock=F('stock') + n)
+
+
+def _bulk_customer_variables(context, i):
+    return {'input': [{'name': f"Bench {i}-{j}", 'email': f"bench-{i}-{j}@example.com"} for j in range(100)]}
+
+
+OPERATIONS = [
+    Operation(
+        'createOrder', CREATE_ORDER, _create_order_variables, setup=_stock_orders,
+        succeeded=lambda data: data['createOrder']['message'] == "Order created successfully.",
+    ),
+    Operation('bulkCreateCustomers', BULK_CREATE_CUSTOMERS, _bulk_customer_variables, batch=100),
+    Operation('updateLowStockProducts', UPDATE_LOW_STOCK),
+    Operation('customers', CUSTOMERS),
+    Operation('orders', ORDERS),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Runner:
+    def __init__(self, iterations=50, warmup=5, use_cache=False):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.use_cache = use_cache
+        self.view = CRMGraphQLView.as_view(schema=schema)
+        self.factory = RequestFactory()
+        self.calls = 0
+
+    def post(self, operation, context):
+        self.calls += 1
+        body = json.dumps({"query": operation.query, "variables": operation.variables(context, self.calls)})
+        response = self.view(self.factory.post('/graphql', body, content_type='application/json'))
+        payload = json.loads(response.content)
+        if response.status_code != 200 or payload.get('errors') or not operation.succeeded(payload['data']):
+            raise RuntimeError(f"{operation.name}: {payload}")
+
+    def measure(self, operation, context):
+        if operation.setup is not None:
+            # warmup + timed iterations + the two instrumented runs
+            operation.setup(context, range(self.calls + 1, self.calls + self.warmup + self.iterations + 3))
+        for _ in range(self.warmup):
+            self.post(operation, context)
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(self.iterations):
+            began = time.perf_counter()
+            self.post(operation, context)
+            latencies.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - start
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.post(operation, context)
+        tracemalloc.start()
+        try:
+            self.post(operation, context)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'ops_per_sec': self.iterations / elapsed,
+            'rows_per_sec': self.iterations * operation.batch / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'sql_queries': len(ctx.captured_queries),
+            'peak_memory_kb': peak / 1024,
+        }
+
+    def run(self, sizes, operations=OPERATIONS, progress=None):
+        """Return ``{str(size): {operation: metrics}}``."""
+        backend = resolver_cache.backend
+        if not self.use_cache:
+            resolver_cache.backend = None
+        results = {}
+        try:
+            for size in sizes:
+                results[str(size)] = self.run_size(size, operations, progress)
+        finally:
+            resolver_cache.backend = backend
+        return results
+
+    def run_size(self, size, operations, progress):
+        results = {}
+        try:
+            with transaction.atomic():
+                create_dataset(customers=size, products=max(10, size // 100), seed=size, offset=10_000_000)
+                context = {
+                    'customers': list(Customer.objects.values_list('pk', flat=True)[:1000]),
+                    'products': list(Product.objects.values_list('pk', flat=True)[:100]),
+                }
+                for operation in operations:
+                    results[operation.name] = self.measure(operation, context)
+                    if progress is not None:
+                        progress(size, operation.name, results[operation.name])
+                raise Rollback
+        except Rollback:
+            pass
+        return results
+
+
+# Metrics where a higher value is better; everything else regresses upwards.
+HIGHER_IS_BETTER = {'ops_per_sec', 'rows_per_sec'}
+
+
+def compare(results, baseline, threshold=0.10):
+    """Diff ``results`` against ``baseline``.
+
+    Returns ``[(size, operation, metric, baseline, current, change, regressed)]``
+    for every metric present in both; ``change`` is relative.
+    """
+    rows = []
+    for size, operations in results.items():
+        for name, metrics in operations.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            for metric, current in metrics.items():
+                previous = before.get(metric)
+                if previous is None:
+                    continue
+                change = (current - previous) / previous if previous else 0.0
+                worse = -change if metric in HIGHER_IS_BETTER else change
+                rows.append((size, name, metric, previous, current, change, worse > threshold))
+    return rows
@@ -0,0 +1,195 @@
+"""
+Set-based bulk creation.
+
+Records are validated in memory, everything they reference is looked up
+with one ``__in`` query per chunk of keys, and rows are inserted with chunked
+``bulk_create`` — a constant number of queries per chunk instead of several
+per record. Errors keep the ``Record <n>: <message>`` format of the
+per-record mutations.
+"""
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from . import customer_stats
+from .caching import invalidate
+from .models import Customer, Order, Product
+from .stock import InsufficientStock, reserve_stock
+from .validators import validate_phone
+
+CHUNK_SIZE = 500
+RESERVE_ATTEMPTS = 3
+
+
+def chunked(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def existing_emails(emails, chunk_size=CHUNK_SIZE):
+    found = set()
+    for chunk in chunked(list(emails), chunk_size):
+        found.update(Customer.objects.filter(email__in=chunk).values_list('email', flat=True))
+    return found
+
+
+def bulk_create_customers(records, chunk_size=CHUNK_SIZE):
+    """Create customers from ``records``; returns ``(customers, errors)``."""
+    errors = {}
+    candidates = []
+    for idx, record in enumerate(records):
+        try:
+            validate_email(record.email)
+        except ValidationError as e:
+            errors[idx] = str(e)
+            continue
+        candidates.append((idx, record))
+
+    # Same precedence as checking record by record: duplicates (in the
+    # database or earlier in this batch) before phone format.
+    taken = existing_emails({record.email for _, record in candidates}, chunk_size)
+    pending = []
+    for idx, record in candidates:
+        if record.email in taken:
+            errors[idx] = "Email already exists"
+        elif record.phone and not validate_phone(record.phone):
+            errors[idx] = "Invalid phone format"
+        else:
+            taken.add(record.email)
+            pending.append((idx, Customer(name=record.name, email=record.email, phone=record.phone)))
+
+    created = []
+    with transaction.atomic():
+        for chunk in chunked(pending, chunk_size):
+            created.extend(_insert_chunk(chunk, errors))
+    # bulk_create sends no post_save
+    invalidate(Customer)
+
+    messages = [f"Record {idx + 1}: {errors[idx]}" for idx in sorted(errors)]
+    return created, messages
+
+
+def _insert_chunk(chunk, errors):
+    try:
+        with transaction.atomic():
+            return Customer.objects.bulk_create([customer for _, customer in chunk])
+    except IntegrityError:
+        # Lost a race with a concurrent insert: drop the emails that now
+        # exist and retry the rest of the chunk once.
+        taken = existing_emails(customer.email for _, customer in chunk)
+        retry = []
+        for idx, customer in chunk:
+            if customer.email in taken:
+                errors[idx] = "Email already exists"
+            else:
+                retry.append(customer)
+        with transaction.atomic():
+            return Customer.objects.bulk_create(retry)
+
+
+def _parse_pk(model, value):
+    try:
+        return model._meta.pk.to_python(value)
+    except ValidationError:
+        return None
+
+
+def order_product_ids(values):
+    """Parsed product ids of one order, each once, in the order given; unparseable ones are ``None``.
+
+    An order holds a product at most once, so a repeated id is neither a
+    second line nor a second unit of stock. ``createOrder`` and
+    ``bulkCreateOrders`` both go through here.
+    """
+    return list(dict.fromkeys(_parse_pk(Product, pk) for pk in values or []))
+
+
+def _allocate(candidates, stock, errors):
+    """The ``(order, products)`` of ``candidates`` that ``stock`` covers, in record order.
+
+    Each product takes one unit; a record any of whose products has run out
+    gets the ``createOrder`` error in ``errors``.
+    """
+    remaining = dict(stock)
+    accepted = []
+    for idx, order, order_products in candidates:
+        short = [p for p in order_products if remaining[p.pk] < 1]
+        if short:
+            errors[idx] = str(InsufficientStock(short))
+            continue
+        for p in order_products:
+            remaining[p.pk] -= 1
+        accepted.append((order, order_products))
+    return accepted
+
+
+def bulk_create_orders(records, chunk_size=CHUNK_SIZE):
+    """Create orders from ``records``; returns ``(orders, errors)``.
+
+    Customers and products for the whole batch are fetched with one
+    ``in_bulk`` each, totals are summed in memory, stock for the whole
+    batch is reserved with one UPDATE, and orders and their product links
+    are written with chunked ``bulk_create``. Records are served from stock
+    in order; those left short are rejected one by one.
+    """
+    parsed = []
+    for record in records:
+        customer_id = _parse_pk(Customer, record.customer_id)
+        parsed.append((record, customer_id, order_product_ids(record.product_ids)))
+
+    customers = Customer.objects.in_bulk({customer_id for _, customer_id, _ in parsed} - {None})
+    products = Product.objects.in_bulk({pk for _, _, ids in parsed for pk in ids} - {None})
+
+    errors = {}
+    candidates = []
+    for idx, (record, customer_id, product_ids) in enumerate(parsed):
+        customer = customers.get(customer_id)
+        if customer is None:
+            errors[idx] = "Invalid customer ID."
+            continue
+        if not product_ids:
+            errors[idx] = "At least one product must be selected."
+            continue
+        if any(pk not in products for pk in product_ids):
+            errors[idx] = "One or more invalid product IDs."
+            continue
+        order_products = [products[pk] for pk in product_ids]
+        order = Order(
+            customer=customer,
+            order_date=record.order_date or timezone.now(),
+            total_amount=sum(p.price for p in order_products),
+        )
+        candidates.append((idx, order, order_products))
+
+    Through = Order.products.through
+    stock = {pk: product.stock for pk, product in products.items()}
+    for attempt in range(RESERVE_ATTEMPTS):
+        shortages = {}
+        pending = _allocate(candidates, stock, shortages)
+        try:
+            with transaction.atomic():
+                # The batch's summed quantities, taken in one conditional UPDATE
+                reserve_stock(Counter(p.pk for _, order_products in pending for p in order_products))
+                for chunk in chunked(pending, chunk_size):
+                    Order.objects.bulk_create([order for order, _ in chunk])
+                    Through.objects.bulk_create(
+                        [Through(order_id=order.pk, product_id=p.pk) for order, order_products in chunk for p in order_products],
+                        batch_size=chunk_size,
+                    )
+                # Re-aggregated once for every customer in the batch
+                customer_stats.refresh({order.customer_id for order, _ in pending}, chunk_size)
+            break
+        except InsufficientStock:
+            # A concurrent order took stock after it was read; allocate again from fresh counts.
+            stock = dict(Product.objects.filter(pk__in=stock).values_list('pk', 'stock'))
+    else:
+        pending = []
+        shortages = {idx: "Stock changed while the order was placed; please retry." for idx, _, _ in candidates}
+    errors.update(shortages)
+    invalidate(Order, Product)
+
+    messages = [f"Record {idx + 1}: {errors[idx]}" for idx in sorted(errors)]
+    return pending, messages
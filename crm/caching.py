@@ -0,0 +1,214 @@
+"""
+Resolver-level result caching.
+
+Entries are keyed by field, arguments, variables and the printed selection
+set, plus a *generation* number for every model the field reads. Writes to
+``Customer``, ``Product`` or ``Order`` (``post_save``, ``post_delete``,
+``m2m_changed`` via crm/signals.py, and the set-based paths that bypass
+signals via ``invalidate()``) bump that model's generation, so stale entries
+are simply never looked up again and age out of the backend. Each bump
+happens at write time (so the writing transaction never reads its own
+stale entries) and again on commit (so no reader can have cached
+pre-commit rows under the current generation).
+
+``CRM_RESOLVER_CACHE['BACKEND']`` selects ``'locmem'`` (a per-process LRU),
+``'django'`` (a Django cache alias shared between workers) or ``None`` to
+disable caching. ``'locmem'`` keeps its generations per process too, so a
+write served by one worker does not invalidate another worker's entries;
+deployments with several processes should use ``'django'`` with a shared
+cache such as Redis or Memcached.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphql import FragmentSpreadNode, print_ast
+
+from .loaders import in_event_loop
+from .models import Customer, Order, Product
+
+MISSING = object()
+
+
+class LocalLRUBackend:
+    blocking = False
+
+    def __init__(self, max_entries=1000, **options):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key, MISSING)
+            if value is not MISSING:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self, label):
+        return self._generations.get(label, 0)
+
+    def bump(self, label):
+        with self._lock:
+            self._generations[label] = self._generations.get(label, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+class DjangoCacheBackend:
+    prefix = "crm:resolver:"
+    # Cache backends may do network or database I/O.
+    blocking = True
+
+    def __init__(self, alias='default', **options):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(self.prefix + key, MISSING)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(self.prefix + key, value, timeout)
+
+    def generation(self, label):
+        return self.cache.get_or_set(f"{self.prefix}gen:{label}", 0, timeout=None)
+
+    def bump(self, label):
+        key = f"{self.prefix}gen:{label}"
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, timeout=None)
+
+    def clear(self):
+        for model in (Customer, Product, Order):
+            self.bump(model._meta.label)
+
+
+BACKENDS = {'locmem': LocalLRUBackend, 'django': DjangoCacheBackend}
+
+
+class ResolverCache:
+    def __init__(self, backend=None, timeout=300):
+        self.backend = backend
+        self.timeout = timeout
+
+    @classmethod
+    def from_settings(cls):
+        options = dict(getattr(settings, 'CRM_RESOLVER_CACHE', {}))
+        name = options.pop('BACKEND', 'locmem')
+        timeout = options.pop('TIMEOUT', 300)
+        if name is None:
+            return cls(None)
+        options = {key.lower(): value for key, value in options.items()}
+        return cls(BACKENDS[name](**options), timeout)
+
+    def key(self, info, args, models):
+        generations = {m._meta.label: self.backend.generation(m._meta.label) for m in models}
+        parts = {
+            'field': f"{info.parent_type.name}.{info.field_name}",
+            'args': args,
+            'variables': info.variable_values,
+            'selection': selection_signature(info),
+            'generations': generations,
+        }
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_or_set(self, info, args, models, compute):
+        if self.backend is None:
+            return compute()
+        key = self.key(info, args, models)
+        value = self.backend.get(key)
+        if value is MISSING:
+            value = compute()
+            self.backend.set(key, value, self.timeout)
+        return value
+
+    async def aget_or_set(self, info, args, models, compute):
+        """Async ``get_or_set``; ``compute`` returns an awaitable."""
+        if self.backend is None:
+            return await compute()
+        call = sync_to_async if self.backend.blocking else _immediate
+        key = await call(self.key)(info, args, models)
+        value = await call(self.backend.get)(key)
+        if value is MISSING:
+            value = await compute()
+            await call(self.backend.set)(key, value, self.timeout)
+        return value
+
+    def invalidate(self, *models):
+        if self.backend is None:
+            return
+        labels = [model._meta.label for model in models]
+        self._bump(labels)
+        # Bumped again once the write is visible: a concurrent reader may have
+        # cached pre-commit rows under the first bump's generation.
+        transaction.on_commit(lambda: self._bump(labels))
+
+    def _bump(self, labels):
+        if self.backend is not None:
+            for label in labels:
+                self.backend.bump(label)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def _immediate(fn):
+    async def call(*args):
+        return fn(*args)
+    return call
+
+
+def selection_signature(info):
+    printed = [print_ast(node) for node in info.field_nodes]
+    if any(_spreads(node) for node in info.field_nodes):
+        printed += [print_ast(info.fragments[name]) for name in sorted(info.fragments)]
+    return printed
+
+
+def _spreads(node):
+    selection_set = getattr(node, 'selection_set', None)
+    if selection_set is None:
+        return False
+    return any(
+        isinstance(selection, FragmentSpreadNode) or _spreads(selection)
+        for selection in selection_set.selections
+    )
+
+
+resolver_cache = ResolverCache.from_settings()
+
+
+def cached_resolver(*models):
+    """Cache a resolver's return value until one of ``models`` changes."""
+    def decorator(resolver):
+        def wrapper(root, info, **args):
+            if in_event_loop():
+                # Under the async view the sync resolver runs off the loop.
+                compute = lambda: sync_to_async(resolver)(root, info, **args)
+                return resolver_cache.aget_or_set(info, args, models, compute)
+            return resolver_cache.get_or_set(info, args, models, lambda: resolver(root, info, **args))
+        return wrapper
+    return decorator
+
+
+def invalidate(*models):
+    resolver_cache.invalidate(*models)
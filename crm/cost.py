@@ -0,0 +1,160 @@
+"""
+Static query cost analysis.
+
+Every object field costs 1 plus the cost of its selections times a list
+multiplier: the ``first``/``last`` page size on connection fields, clamped
+to ``[0, RELAY_CONNECTION_MAX_LIMIT]`` (the max limit when neither is
+given), the ``first`` argument on plain list fields that take one
+(``search``, default included), ``DEFAULT_LIST_SIZE`` on other list fields
+such as ``orderSet`` and ``products``, and 1 otherwise. Scalars and
+introspection fields are free.
+
+Page sizes usually arrive as variables, which validation never sees, so
+the analysis runs on the already-validated (and cached) document right
+before execution. Operations over ``CRM_QUERY_COST['MAX_COST']`` or
+nested deeper than ``MAX_DEPTH`` are rejected without touching the
+database.
+"""
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    get_named_type,
+    get_nullable_type,
+    get_operation_ast,
+    is_leaf_type,
+    is_list_type,
+    type_from_ast,
+)
+from graphql.execution.values import get_argument_values, get_variable_values
+
+DEFAULTS = {'MAX_COST': 5000, 'MAX_DEPTH': 10, 'DEFAULT_LIST_SIZE': 10}
+
+
+def cost_settings():
+    return {**DEFAULTS, **getattr(settings, 'CRM_QUERY_COST', {})}
+
+
+class QueryTooExpensive(GraphQLError):
+    pass
+
+
+def is_connection(graphql_type):
+    return 'pageInfo' in getattr(graphql_type, 'fields', {})
+
+
+class CostAnalysis:
+    def __init__(self, schema, document, variables=None, default_list_size=10):
+        self.schema = schema
+        self.document = document
+        self.variables = variables or {}
+        self.default_list_size = default_list_size
+        self.coerced = {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if definition.kind == 'fragment_definition'
+        }
+
+    def operation(self, operation):
+        """Return ``(cost, depth)`` for ``operation``."""
+        root_type = self.schema.get_root_type(operation.operation)
+        coerced = get_variable_values(self.schema, operation.variable_definitions or [], self.variables)
+        # Malformed variables are reported by execute(); price them at the ceiling.
+        self.coerced = coerced if isinstance(coerced, dict) else {}
+        return self.selection_set(root_type, operation.selection_set)
+
+    def selection_set(self, parent_type, selection_set):
+        cost = depth = 0
+        for field, field_def in self.fields(parent_type, selection_set):
+            field_cost, field_depth = self.field(parent_type, field, field_def)
+            cost += field_cost
+            depth = max(depth, field_depth)
+        return cost, depth
+
+    def fields(self, parent_type, selection_set):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                if not name.startswith('__'):
+                    yield selection, parent_type.fields[name]
+            else:
+                if isinstance(selection, FragmentSpreadNode):
+                    fragment = self.fragments[selection.name.value]
+                else:
+                    fragment = selection
+                fragment_type = parent_type
+                if fragment.type_condition is not None:
+                    fragment_type = type_from_ast(self.schema, fragment.type_condition)
+                yield from self.fields(fragment_type, fragment.selection_set)
+
+    def field(self, parent_type, node, field_def):
+        named_type = get_named_type(field_def.type)
+        if is_leaf_type(named_type) or node.selection_set is None:
+            return 0, 0
+        children, depth = self.selection_set(named_type, node.selection_set)
+        return 1 + self.multiplier(parent_type, node, field_def) * children, depth + 1
+
+    def multiplier(self, parent_type, node, field_def):
+        if is_connection(get_named_type(field_def.type)):
+            try:
+                args = get_argument_values(field_def, node, self.coerced)
+            except GraphQLError:
+                args = {}
+            max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+            size = args.get('first') if args.get('first') is not None else args.get('last')
+            # Out-of-range sizes are refused by the resolver; a negative one
+            # must not offset the cost of its siblings meanwhile.
+            return max_limit if size is None else min(max(size, 0), max_limit)
+        if is_list_type(get_nullable_type(field_def.type)):
+            # Connection edges are already priced by the page size.
+            if is_connection(parent_type):
+                return 1
+            if 'first' in field_def.args:
+                try:
+                    size = get_argument_values(field_def, node, self.coerced).get('first')
+                except GraphQLError:
+                    size = None
+                if size is not None:
+                    return max(size, 1)
+            return self.default_list_size
+        return 1
+
+
+def query_cost(schema, document, operation_name=None, variables=None, default_list_size=None):
+    """Return ``(cost, depth)`` of the operation, or ``None`` if there isn't one."""
+    graphql_schema = getattr(schema, 'graphql_schema', schema)
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return None
+    if default_list_size is None:
+        default_list_size = cost_settings()['DEFAULT_LIST_SIZE']
+    return CostAnalysis(graphql_schema, document, variables, default_list_size).operation(operation)
+
+
+def check_query_cost(schema, document, operation_name=None, variables=None):
+    """Return the ``cost`` response extension, raising ``QueryTooExpensive`` over budget."""
+    limits = cost_settings()
+    measured = query_cost(schema, document, operation_name, variables, limits['DEFAULT_LIST_SIZE'])
+    if measured is None:
+        return None
+    cost, depth = measured
+    extension = {
+        'requestedQueryCost': cost,
+        'maximumAvailable': limits['MAX_COST'],
+        'depth': depth,
+        'maximumDepth': limits['MAX_DEPTH'],
+    }
+    if cost > limits['MAX_COST']:
+        raise QueryTooExpensive(
+            f"Query cost {cost} exceeds the maximum of {limits['MAX_COST']}.",
+            extensions={'code': 'QUERY_TOO_EXPENSIVE', 'cost': extension},
+        )
+    if depth > limits['MAX_DEPTH']:
+        raise QueryTooExpensive(
+            f"Query depth {depth} exceeds the maximum of {limits['MAX_DEPTH']}.",
+            extensions={'code': 'QUERY_TOO_EXPENSIVE', 'cost': extension},
+        )
+    return extension
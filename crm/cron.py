@@ -1,6 +1,6 @@
 from datetime import datetime
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+from crm.executor import get_executor
+from crm.reminders import queue_order_reminders
 
 # Heartbeat Cron Task
 def log_crm_heartbeat():
@@ -10,13 +10,8 @@ def log_crm_heartbeat():
         f.write(message)
 
     try:
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            verify=True,
-            retries=3,
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=False)
-        query = gql("{ hello }")
+        client = get_executor()
+        query = "{ hello }"
         response = client.execute(query)
         print("GraphQL hello response:", response)
     except Exception as e:
@@ -25,43 +20,10 @@ def log_crm_heartbeat():
 
 # Order Reminder Cron Task
 def send_order_reminders():
-    timestamp = datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
-    log_file = "/tmp/order_reminders_log.txt"
-
+    # Outbox plus Celery fan-out (crm/reminders.py); reruns never send twice
     try:
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            verify=True,
-            retries=3,
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=False)
-
-        query = gql("""
-        {
-          orders(filter: {orderDate_Gte: "%s"}) {
-            edges {
-              node {
-                id
-                customer {
-                  email
-                }
-              }
-            }
-          }
-        }
-        """ % (datetime.now().date().isoformat()))
-
-        response = client.execute(query)
-        orders = response["orders"]["edges"]
-
-        with open(log_file, "a") as f:
-            f.write(f"{timestamp} Order reminders:\n")
-            for edge in orders:
-                order = edge["node"]
-                f.write(f"  - Order ID: {order['id']}, Customer Email: {order['customer']['email']}\n")
-
-        print("Order reminders processed!")
-
+        queued, tasks = queue_order_reminders()
+        print(f"Order reminders processed: {queued} queued, {tasks} batches dispatched.")
     except Exception as e:
         print("Failed to send order reminders:", str(e))
 
@@ -72,21 +34,16 @@ def update_low_stock():
     log_file = "/tmp/low_stock_updates_log.txt"
 
     try:
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            verify=True,
-            retries=3,
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=False)
+        client = get_executor()
 
-        mutation = gql("""
+        mutation = """
         mutation {
           updateLowStockProducts {
             updatedProducts
             success
           }
         }
-        """)
+        """
 
         response = client.execute(mutation)
         updated_products = response["updateLowStockProducts"]["updatedProducts"]
@@ -2,8 +2,10 @@
 
 import datetime
 import logging
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+import os
+import sys
+
+import django
 
 # Setup logging
 log_file = "/tmp/order_reminders_log.txt"
@@ -12,41 +14,18 @@ logging.basicConfig(filename=log_file, level=logging.INFO)
 # Timestamp for log entries
 timestamp = datetime.datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
 
-# Define the GraphQL query
-query = gql("""
-query GetRecentOrders {
-  orders(orderDate_Gte: "%s") {
-    edges {
-      node {
-        id
-        customer {
-          email
-        }
-      }
-    }
-  }
-}
-""" % (datetime.date.today() - datetime.timedelta(days=7)))
-
-# Set up the GraphQL client
-transport = RequestsHTTPTransport(
-    url="http://localhost:8000/graphql",
-    verify=True,
-    retries=3,
-)
-
-client = Client(transport=transport, fetch_schema_from_transport=False)
-
-# Run the query and log the output
-try:
-    result = client.execute(query)
-    orders = result["orders"]["edges"]
-    
-    for order in orders:
-        order_id = order["node"]["id"]
-        email = order["node"]["customer"]["email"]
-        logging.info(f"{timestamp} Order ID: {order_id}, Email: {email}")
+# Setup Django from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
+django.setup()
 
+from crm.reminders import queue_order_reminders  # noqa: E402
+
+# Queue reminders for the last 7 days of orders in the outbox and dispatch
+# them to Celery in per-customer batches; reruns never send twice
+try:
+    queued, tasks = queue_order_reminders()
+    logging.info(f"{timestamp} Queued {queued} reminders, dispatched {tasks} batches")
     print("Order reminders processed!")
 
 except Exception as e:
@@ -0,0 +1,126 @@
+"""
+Materialised per-customer order summaries (``CustomerStats``).
+
+A row exists exactly for the customers that have orders, so "top customers
+by spend" is a walk down one ``CustomerStats`` index and "customers without
+orders" an anti-join on its primary key; neither touches ``Order``.
+
+Rows are maintained incrementally from crm/signals.py: a new order bumps
+its customer's count, spend and first/last dates with one ``UPDATE ... SET
+x = x + n`` (an INSERT for a customer's first order), changes to an order's
+total move the spend the same way, and edits or deletes that could move a
+first/last date re-aggregate only the customers involved. Set-based paths
+that bypass signals call ``refresh`` for the customers they touched;
+``rebuild`` (``manage.py rebuild_customer_stats``) recomputes every row in
+customer id-range batches.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Least
+
+from .caching import invalidate
+from .models import CustomerStats, Order
+
+CHUNK_SIZE = 500
+SUMMARY_FIELDS = ['order_count', 'total_spent', 'first_order_date', 'last_order_date']
+
+
+def record_order(order):
+    """Fold a newly created ``order`` into its customer's row."""
+    total = Decimal(str(order.total_amount))
+    updated = CustomerStats.objects.filter(pk=order.customer_id).update(
+        order_count=F('order_count') + 1,
+        total_spent=F('total_spent') + total,
+        first_order_date=Least(F('first_order_date'), Value(order.order_date)),
+        last_order_date=Greatest(F('last_order_date'), Value(order.order_date)),
+    )
+    if not updated:
+        try:
+            with transaction.atomic():
+                CustomerStats.objects.create(
+                    customer_id=order.customer_id,
+                    order_count=1,
+                    total_spent=total,
+                    first_order_date=order.order_date,
+                    last_order_date=order.order_date,
+                )
+        except IntegrityError:
+            # A concurrent first order created the row; fold into it.
+            return record_order(order)
+    invalidate(CustomerStats)
+
+
+def orders_per_customer(order_ids):
+    """``{customer_id: number of orders}`` among ``order_ids``."""
+    rows = Order.objects.filter(pk__in=order_ids).values('customer_id').annotate(n=Count('id')).order_by()
+    return {row['customer_id']: row['n'] for row in rows}
+
+
+def add_spent(counts, delta):
+    """Add ``delta`` to the spend of ``counts`` (``{customer_id: orders whose total moved}``)."""
+    if not delta:
+        return
+    for customer_id, n in counts.items():
+        CustomerStats.objects.filter(pk=customer_id).update(total_spent=F('total_spent') + delta * n)
+    invalidate(CustomerStats)
+
+
+def _summaries(orders):
+    return (
+        orders.values('customer_id')
+        .annotate(
+            order_count=Count('id'),
+            total_spent=Sum('total_amount'),
+            first_order_date=Min('order_date'),
+            last_order_date=Max('order_date'),
+        )
+        .order_by('customer_id')
+    )
+
+
+def _replace(summaries, stale=None):
+    """Upsert ``summaries`` and delete the ``stale`` rows that have none."""
+    rows = [CustomerStats(**summary) for summary in summaries]
+    with transaction.atomic(savepoint=False):
+        if rows:
+            CustomerStats.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['customer'], update_fields=SUMMARY_FIELDS,
+            )
+        if stale is not None:
+            stale.exclude(pk__in=[row.customer_id for row in rows]).delete()
+    return len(rows)
+
+
+def refresh(customer_ids, chunk_size=CHUNK_SIZE):
+    """Re-aggregate the rows of ``customer_ids`` from their orders."""
+    customer_ids = sorted(set(customer_ids))
+    for start in range(0, len(customer_ids), chunk_size):
+        chunk = customer_ids[start:start + chunk_size]
+        summaries = list(_summaries(Order.objects.filter(customer_id__in=chunk)))
+        # Only customers left without orders can have a row to drop.
+        emptied = set(chunk) - {summary['customer_id'] for summary in summaries}
+        _replace(summaries, CustomerStats.objects.filter(pk__in=emptied) if emptied else None)
+    if customer_ids:
+        invalidate(CustomerStats)
+
+
+def rebuild(batch_size=10_000, progress=None):
+    """Recompute every row in customer id-range batches; returns the number of rows."""
+    bounds = Order.objects.aggregate(low=Min('customer_id'), high=Max('customer_id'))
+    total = 0
+    if bounds['low'] is None:
+        CustomerStats.objects.all().delete()
+    else:
+        CustomerStats.objects.exclude(pk__gte=bounds['low'], pk__lte=bounds['high']).delete()
+        for low in range(bounds['low'], bounds['high'] + 1, batch_size):
+            span = {'customer_id__gte': low, 'customer_id__lt': low + batch_size}
+            total += _replace(
+                _summaries(Order.objects.filter(**span)),
+                CustomerStats.objects.filter(**span),
+            )
+            if progress is not None:
+                progress(min(low + batch_size - 1, bounds['high']), total)
+    invalidate(CustomerStats)
+    return total
@@ -0,0 +1,145 @@
+"""
+Parsed-document cache and persisted query registry.
+
+``get_document`` returns a parsed *and validated* ``DocumentNode`` for a query
+string, keeping the most recently used ones in a size-bounded LRU so the
+handful of documents cron jobs and dashboards send over and over skip
+``parse()`` and ``validate()`` entirely.
+
+Persisted queries follow the Apollo automatic persisted query protocol:
+clients send ``extensions.persistedQuery.sha256Hash`` instead of the query
+text; an unknown hash answers ``PersistedQueryNotFound`` and the client
+retries once with both hash and text, which registers the document. Hash →
+text mappings live in the Django cache so every worker shares them.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLError, parse, validate
+
+REGISTRY_PREFIX = "crm:persisted-query:"
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class DocumentCache:
+    def __init__(self, maxsize=500):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is None:
+                self.misses += 1
+                return None
+            self._documents.move_to_end(key)
+            self.hits += 1
+            return document
+
+    def set(self, key, document):
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._documents),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+document_cache = DocumentCache(getattr(settings, 'CRM_DOCUMENT_CACHE_SIZE', 500))
+
+
+def get_document(schema, query, validation_rules=None, max_errors=None):
+    """Return ``(document, errors)``; only valid documents are cached."""
+    graphql_schema = getattr(schema, 'graphql_schema', schema)
+    key = (id(graphql_schema), tuple(validation_rules or ()), query_hash(query))
+    document = document_cache.get(key)
+    if document is not None:
+        return document, []
+
+    try:
+        document = parse(query)
+    except GraphQLError as error:
+        return None, [error]
+    errors = validate(graphql_schema, document, validation_rules, max_errors)
+    if errors:
+        return None, errors
+    document_cache.set(key, document)
+    return document, []
+
+
+class PersistedQueryError(Exception):
+    code = None
+
+
+class PersistedQueryNotFound(PersistedQueryError):
+    code = "PERSISTED_QUERY_NOT_FOUND"
+
+    def __init__(self):
+        super().__init__("PersistedQueryNotFound")
+
+
+class PersistedQueryMismatch(PersistedQueryError):
+    code = "PERSISTED_QUERY_HASH_MISMATCH"
+
+    def __init__(self):
+        super().__init__("provided sha does not match query")
+
+
+class PersistedQueryInvalid(PersistedQueryError):
+    code = "PERSISTED_QUERY_INVALID"
+
+
+def register_query(query):
+    """Register ``query`` as a persisted document and return its hash."""
+    sha256 = query_hash(query)
+    cache.set(REGISTRY_PREFIX + sha256, query, timeout=None)
+    return sha256
+
+
+def resolve_persisted_query(query, extensions):
+    """Apply the APQ protocol to a request's ``query``/``extensions``."""
+    if not extensions:
+        return query
+    if not isinstance(extensions, dict):
+        raise PersistedQueryInvalid("extensions must be an object")
+    persisted = extensions.get('persistedQuery')
+    if persisted is None:
+        return query
+    if not isinstance(persisted, dict) or not isinstance(persisted.get('sha256Hash'), str):
+        raise PersistedQueryInvalid("persistedQuery must be an object with a sha256Hash string")
+    sha256 = persisted['sha256Hash']
+    if query:
+        if query_hash(query) != sha256:
+            raise PersistedQueryMismatch()
+        register_query(query)
+        return query
+    query = cache.get(REGISTRY_PREFIX + sha256)
+    if query is None:
+        raise PersistedQueryNotFound()
+    return query
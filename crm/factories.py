@@ -0,0 +1,185 @@
+"""
+Deterministic CRM data at any volume.
+
+Customers, products and orders follow the shapes in seed_db.py (the same
+product catalogue and price points, a mix of phone formats and customers
+without a phone) and are written with chunked ``bulk_create``.
+The same ``seed`` always produces the same rows.
+"""
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .bulk import CHUNK_SIZE, chunked
+from .caching import invalidate
+from .models import Customer, CustomerStats, Order, Product
+
+FIRST_NAMES = ["Alice", "Bob", "Carol", "David", "Erin", "Frank", "Grace", "Heidi", "Ivan", "Judy"]
+LAST_NAMES = ["Johnson", "Smith", "Brown", "Wilson", "Taylor", "Moore", "Clark", "Lewis", "Walker", "Hall"]
+
+CATALOGUE = [
+    ("Laptop", Decimal("999.99"), 10),
+    ("Mouse", Decimal("29.99"), 50),
+    ("Keyboard", Decimal("79.99"), 30),
+    ("Monitor", Decimal("299.99"), 15),
+    ("Headphones", Decimal("199.99"), 25),
+]
+
+# Formats validate_phone accepts; None leaves the phone blank.
+PHONE_FORMATS = ["{a}-{b}-{c}", "+1 {a}-{b}-{c}", "{a} {b} {c}", "{a}{b}{c}", None]
+
+
+def phone_number(rng):
+    template = rng.choice(PHONE_FORMATS)
+    if template is None:
+        return None
+    return template.format(a=rng.randint(200, 999), b=rng.randint(100, 999), c=f"{rng.randint(0, 9999):04d}")
+
+
+def build_customers(count, rng, offset=0):
+    customers = []
+    for i in range(offset, offset + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        customers.append(Customer(
+            name=f"{first} {last}",
+            email=f"{first.lower()}.{last.lower()}.{i}@example.com",
+            phone=phone_number(rng),
+        ))
+    return customers
+
+
+def build_products(count, rng, offset=0):
+    products = []
+    for i in range(offset, offset + count):
+        name, price, stock = CATALOGUE[i % len(CATALOGUE)]
+        products.append(Product(
+            name=f"{name} {i // len(CATALOGUE) + 1}",
+            price=price,
+            stock=rng.randint(0, stock * 2),
+        ))
+    return products
+
+
+def poisson(rng, mean):
+    # Knuth's method; fine for the small means used for orders per customer.
+    limit, k, p = math.exp(-mean), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+ORDER_DISTRIBUTIONS = {
+    'uniform': lambda rng, mean: rng.randint(0, round(mean * 2)),
+    'poisson': poisson,
+    'fixed': lambda rng, mean: round(mean),
+}
+
+
+def insert_order_products(pairs):
+    """Insert ``(order_id, product_id)`` links with one ``executemany``.
+
+    Link rows outnumber orders and need no primary keys back, so they skip
+    building a model instance per row.
+    """
+    Through = Order.products.through
+    qn = connection.ops.quote_name
+    columns = [Through._meta.get_field(name).column for name in ('order', 'product')]
+    sql = f"INSERT INTO {qn(Through._meta.db_table)} ({qn(columns[0])}, {qn(columns[1])}) VALUES (%s, %s)"
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, pairs)
+
+
+def summarise(orders):
+    """``CustomerStats`` rows for ``orders``, whose customers have no other orders."""
+    stats = {}
+    for order in orders:
+        row = stats.get(order.customer_id)
+        if row is None:
+            stats[order.customer_id] = CustomerStats(
+                customer_id=order.customer_id,
+                order_count=1,
+                total_spent=order.total_amount,
+                first_order_date=order.order_date,
+                last_order_date=order.order_date,
+            )
+        else:
+            row.order_count += 1
+            row.total_spent += order.total_amount
+            row.first_order_date = min(row.first_order_date, order.order_date)
+            row.last_order_date = max(row.last_order_date, order.order_date)
+    return list(stats.values())
+
+
+def create_dataset(
+    customers=100,
+    products=25,
+    orders_per_customer=3,
+    products_per_order=(1, 3),
+    seed=0,
+    days=90,
+    now=None,
+    order_distribution='uniform',
+    offset=0,
+    chunk_size=CHUNK_SIZE,
+    progress=None,
+    product_offset=None,
+):
+    """Insert a dataset and return ``{'customers': n, 'products': n, 'orders': n}``.
+
+    Each customer gets a number of orders drawn from ``order_distribution``
+    with mean ``orders_per_customer``; each order gets between
+    ``products_per_order`` distinct products and a date in the last
+    ``days``. Totals and ``CustomerStats`` rows are summed in memory since
+    ``bulk_create`` bypasses the signals that normally maintain them. Every
+    chunk of customers and their orders is its own transaction, and
+    ``progress`` (if given) is called with the running totals after each
+    one. ``offset`` shifts the generated emails and ``product_offset``
+    (defaulting to ``offset``) the product names, so repeated runs do not
+    collide.
+    """
+    rng = random.Random(seed)
+    now = now or timezone.now()
+    product_offset = offset if product_offset is None else product_offset
+    draw_orders = ORDER_DISTRIBUTIONS[order_distribution]
+    totals = {'customers': 0, 'products': 0, 'orders': 0}
+
+    catalogue = []
+    with transaction.atomic():
+        for chunk in chunked(build_products(products, rng, product_offset), chunk_size):
+            catalogue.extend(Product.objects.bulk_create(chunk))
+    totals['products'] = len(catalogue)
+    low, high = products_per_order
+    high = min(high, len(catalogue))
+
+    for start in range(0, customers, chunk_size):
+        with transaction.atomic():
+            batch = Customer.objects.bulk_create(
+                build_customers(min(chunk_size, customers - start), rng, offset + start)
+            )
+            pending = []
+            for customer in batch:
+                for _ in range(draw_orders(rng, orders_per_customer) if catalogue else 0):
+                    chosen = rng.sample(catalogue, rng.randint(min(low, high), high))
+                    order = Order(
+                        customer=customer,
+                        order_date=now - timedelta(seconds=rng.randint(0, days * 86400)),
+                        total_amount=sum(p.price for p in chosen),
+                    )
+                    pending.append((order, chosen))
+            for chunk in chunked(pending, chunk_size):
+                Order.objects.bulk_create([order for order, _ in chunk])
+                insert_order_products([(order.pk, p.pk) for order, chosen in chunk for p in chosen])
+            CustomerStats.objects.bulk_create(summarise([order for order, _ in pending]), batch_size=chunk_size)
+        totals['customers'] += len(batch)
+        totals['orders'] += len(pending)
+        if progress is not None:
+            progress(totals)
+
+    invalidate(Customer, Product, Order, CustomerStats)
+    return totals
@@ -1,28 +1,39 @@
 import django_filters
-from .models import Customer, Product, Order
+from .models import Customer, CustomerStats, Product, Order
+from .search import contains
 from django.db.models import Q
 
 class CustomerFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
-    email = django_filters.CharFilter(field_name='email', lookup_expr='icontains')
+    name = django_filters.CharFilter(method='filter_contains')
+    email = django_filters.CharFilter(method='filter_contains')
     created_at__gte = django_filters.DateFilter(field_name='created_at', lookup_expr='gte')
     created_at__lte = django_filters.DateFilter(field_name='created_at', lookup_expr='lte')
     phone_pattern = django_filters.CharFilter(method='filter_phone_pattern')
+    has_orders = django_filters.BooleanFilter(field_name='stats', lookup_expr='isnull', exclude=True)
 
     def filter_phone_pattern(self, queryset, name, value):
-        return queryset.filter(phone__startswith=value)
+        # A half-open range instead of LIKE 'x%' so the phone index is used
+        # on every backend regardless of LIKE collation rules.
+        return queryset.filter(phone__gte=value, phone__lt=value + '\U0010ffff')
+
+    def filter_contains(self, queryset, name, value):
+        # icontains, answered from the trigram index where there is one (crm/search.py)
+        return contains(queryset, name, value)
 
     class Meta:
         model = Customer
         fields = ['name', 'email', 'created_at__gte', 'created_at__lte']
 
 class ProductFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
+    name = django_filters.CharFilter(method='filter_contains')
     price__gte = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
     price__lte = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     stock__gte = django_filters.NumberFilter(field_name='stock', lookup_expr='gte')
     stock__lte = django_filters.NumberFilter(field_name='stock', lookup_expr='lte')
 
+    def filter_contains(self, queryset, name, value):
+        return contains(queryset, name, value)
+
     class Meta:
         model = Product
         fields = []
@@ -37,7 +48,7 @@ class OrderFilter(django_filters.FilterSet):
     product_id = django_filters.NumberFilter(method='filter_by_product_id')
 
     def filter_by_product_name(self, queryset, name, value):
-        return queryset.filter(products__name__icontains=value)
+        return queryset.filter(products__name__icontains=value).distinct()
 
     def filter_by_product_id(self, queryset, name, value):
         return queryset.filter(products__id=value)
@@ -46,3 +57,14 @@ class OrderFilter(django_filters.FilterSet):
         model = Order
         fields = []
 
+class CustomerStatsFilter(django_filters.FilterSet):
+    order_count__gte = django_filters.NumberFilter(field_name='order_count', lookup_expr='gte')
+    order_count__lte = django_filters.NumberFilter(field_name='order_count', lookup_expr='lte')
+    total_spent__gte = django_filters.NumberFilter(field_name='total_spent', lookup_expr='gte')
+    total_spent__lte = django_filters.NumberFilter(field_name='total_spent', lookup_expr='lte')
+    last_order_date__gte = django_filters.DateFilter(field_name='last_order_date', lookup_expr='gte')
+    last_order_date__lte = django_filters.DateFilter(field_name='last_order_date', lookup_expr='lte')
+
+    class Meta:
+        model = CustomerStats
+        fields = []
@@ -0,0 +1,166 @@
+"""
+Streaming CSV imports.
+
+The file is read with ``csv.DictReader`` and handled ``chunk_size`` rows at
+a time, so memory is bounded by one chunk plus the keys already seen. Rows
+are validated with the mutations' rules (``validate_email`` and
+``validate_phone`` for customers, positive price and non-negative stock for
+products) and deduplicated on their natural key, the customer's email or
+the product's name; the first occurrence in the file wins. Each chunk is
+then upserted with one ``bulk_create(update_conflicts=True)`` in its own
+transaction. Rejected rows are written to a CSV with their line number and
+the reason.
+"""
+import csv
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .bulk import CHUNK_SIZE
+from .caching import invalidate
+from .export import CENTS, batched
+from .models import Customer, Product
+from .validators import validate_phone
+
+
+class ImportFileError(Exception):
+    pass
+
+
+class RowError(Exception):
+    pass
+
+
+def _text(row, column):
+    return (row.get(column) or "").strip()
+
+
+def _name(row, model):
+    name = _text(row, 'name')
+    if not name:
+        raise RowError("Name is required.")
+    if len(name) > model._meta.get_field('name').max_length:
+        raise RowError("Name is too long.")
+    return name
+
+
+def clean_customer(row):
+    name = _name(row, Customer)
+    email = _text(row, 'email')
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise RowError("Invalid email format.")
+    if len(email) > Customer._meta.get_field('email').max_length:
+        raise RowError("Invalid email format.")
+    phone = _text(row, 'phone') or None
+    if phone and not validate_phone(phone):
+        raise RowError("Invalid phone format.")
+    return Customer(name=name, email=email, phone=phone)
+
+
+def clean_product(row):
+    name = _name(row, Product)
+    try:
+        price = Decimal(_text(row, 'price'))
+    except InvalidOperation:
+        raise RowError("Invalid price.")
+    if not price.is_finite() or price >= 10 ** 8:
+        raise RowError("Invalid price.")
+    if price <= 0:
+        raise RowError("Price must be positive.")
+    try:
+        stock = int(_text(row, 'stock') or 0)
+    except ValueError:
+        raise RowError("Invalid stock.")
+    if stock < 0:
+        raise RowError("Stock cannot be negative.")
+    return Product(name=name, price=price.quantize(CENTS), stock=stock)
+
+
+# kind -> (model, clean, key, update_fields, required columns)
+IMPORTS = {
+    'customers': (Customer, clean_customer, 'email', ['name', 'phone'], ['name', 'email']),
+    'products': (Product, clean_product, 'name', ['price', 'stock'], ['name', 'price']),
+}
+
+
+def import_rows(kind, rows, chunk_size=CHUNK_SIZE, reject=None, dry_run=False):
+    """Validate and upsert ``(line, row)`` pairs; yields stats per chunk.
+
+    ``reject(line, row, reason)`` is called for every rejected row. Each
+    yielded dict has ``rows``, ``created``, ``updated``, ``rejected`` and
+    ``seconds`` for that chunk. With ``dry_run`` nothing is written, but
+    ``created``/``updated`` still report what would have been.
+    """
+    if kind not in IMPORTS:
+        raise ImportFileError(f"Unknown import: {kind}")
+    if chunk_size < 1:
+        raise ImportFileError("chunk_size must be positive.")
+    model, clean, key, update_fields, _ = IMPORTS[kind]
+    seen = set()
+
+    for chunk in batched(rows, chunk_size):
+        start = time.perf_counter()
+        pending = []
+        rejected = 0
+        for line, row in chunk:
+            try:
+                instance = clean(row)
+                if getattr(instance, key) in seen:
+                    raise RowError(f"Duplicate {key} in file.")
+            except RowError as e:
+                rejected += 1
+                if reject is not None:
+                    reject(line, row, str(e))
+                continue
+            seen.add(getattr(instance, key))
+            pending.append(instance)
+
+        keys = [getattr(instance, key) for instance in pending]
+        with transaction.atomic():
+            existing = model.objects.filter(**{f'{key}__in': keys}).count() if keys else 0
+            if pending and not dry_run:
+                model.objects.bulk_create(
+                    pending, update_conflicts=True, unique_fields=[key], update_fields=update_fields,
+                )
+        if pending and not dry_run:
+            # bulk_create sends no post_save
+            invalidate(model)
+
+        yield {
+            'rows': len(chunk),
+            'created': len(pending) - existing,
+            'updated': existing,
+            'rejected': rejected,
+            'seconds': time.perf_counter() - start,
+        }
+
+
+def import_csv(kind, source, rejects=None, chunk_size=CHUNK_SIZE, dry_run=False):
+    """Import the CSV file object ``source``; yields the ``import_rows`` stats.
+
+    Rejected rows are written to the file object ``rejects`` (if given) as
+    CSV with ``line`` and ``error`` columns ahead of the original ones.
+    """
+    if kind not in IMPORTS:
+        raise ImportFileError(f"Unknown import: {kind}")
+    reader = csv.DictReader(source)
+    columns = reader.fieldnames or []
+    missing = [column for column in IMPORTS[kind][4] if column not in columns]
+    if missing:
+        raise ImportFileError(f"Missing columns: {', '.join(missing)}")
+
+    reject = None
+    if rejects is not None:
+        writer = csv.DictWriter(rejects, ['line', 'error'] + columns, extrasaction='ignore')
+        writer.writeheader()
+
+        def reject(line, row, reason):
+            writer.writerow({**row, 'line': line, 'error': reason})
+
+    rows = ((reader.line_num, row) for row in reader)
+    return import_rows(kind, rows, chunk_size, reject, dry_run)
@@ -0,0 +1,175 @@
+"""
+Per-request DataLoaders for the CRM schema.
+
+Resolution is synchronous, so instead of waiting for an event-loop tick a
+loader collects keys up front: whenever a list of customers, orders or
+products is handed to GraphQL, its keys are queued on the loaders that the
+nested fields will use. The first nested resolver that misses the cache
+dispatches the whole queue in one SQL query, every sibling after it is a
+cache hit.
+
+Under the async view (crm/views.py) the same loaders are built from
+``AsyncDataLoader``: a miss returns an awaitable, and every key requested
+before the event loop next gets control is fetched in one batch, with the
+batch query run off the loop via ``sync_to_async``.
+"""
+import asyncio
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+
+from .models import Customer, CustomerStats, Order, Product
+
+
+def in_event_loop():
+    """True when called on a running event loop, where the sync ORM is off limits."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class DataLoader:
+    def __init__(self, batch_load_fn):
+        self.batch_load_fn = batch_load_fn
+        self._cache = {}
+        self._queue = {}
+
+    def queue(self, keys):
+        for key in keys:
+            if key not in self._cache:
+                self._queue[key] = None
+
+    def prime(self, key, value):
+        self._cache.setdefault(key, value)
+        self._queue.pop(key, None)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._queue[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        self.queue(keys)
+        if self._queue:
+            self.dispatch()
+        return [self._cache[key] for key in keys]
+
+    def dispatch(self):
+        keys = list(self._queue)
+        self._queue.clear()
+        if keys:
+            self._cache.update(zip(keys, self.batch_load_fn(keys)))
+
+
+class AsyncDataLoader(DataLoader):
+    def __init__(self, batch_load_fn):
+        super().__init__(batch_load_fn)
+        self._batch = None
+
+    def load(self, key):
+        if key in self._cache:
+            return self._cache[key]
+        self._queue[key] = None
+        return self._wait(lambda: self._cache[key])
+
+    def load_many(self, keys):
+        self.queue(keys)
+        if not self._queue:
+            return [self._cache[key] for key in keys]
+        return self._wait(lambda: [self._cache[key] for key in keys])
+
+    async def _wait(self, result):
+        if self._batch is None:
+            self._batch = asyncio.ensure_future(self._dispatch_soon())
+        await self._batch
+        return result()
+
+    async def _dispatch_soon(self):
+        # Let sibling resolvers queue their keys first.
+        await asyncio.sleep(0)
+        self._batch = None
+        keys = list(self._queue)
+        self._queue.clear()
+        if keys:
+            values = await sync_to_async(self.batch_load_fn)(keys)
+            self._cache.update(zip(keys, values))
+
+
+class Loaders:
+    """All loaders for one request, stored on ``info.context``."""
+
+    def __init__(self, loader_class=DataLoader):
+        self.customer_by_id = loader_class(self._load_customers)
+        self.orders_by_customer_id = loader_class(self._load_orders_by_customer)
+        self.products_by_order_id = loader_class(self._load_products_by_order)
+        self.orders_by_product_id = loader_class(self._load_orders_by_product)
+        self.stats_by_customer_id = loader_class(self._load_stats)
+
+    # Queue the keys nested fields of these instances will ask for
+    def track(self, instances):
+        instances = list(instances)
+        if not instances:
+            return instances
+        model = type(instances[0])
+        if model is Order:
+            # Planned querysets may defer the FK column when customer isn't selected.
+            if 'customer_id' not in instances[0].get_deferred_fields():
+                self.customer_by_id.queue(o.customer_id for o in instances)
+            self.products_by_order_id.queue(o.pk for o in instances)
+        elif model is Customer:
+            for customer in instances:
+                self.customer_by_id.prime(customer.pk, customer)
+            self.orders_by_customer_id.queue(c.pk for c in instances)
+            self.stats_by_customer_id.queue(c.pk for c in instances)
+        elif model is Product:
+            self.orders_by_product_id.queue(p.pk for p in instances)
+        return instances
+
+    def _load_customers(self, keys):
+        customers = Customer.objects.in_bulk(keys)
+        return [customers.get(key) for key in keys]
+
+    def _load_stats(self, keys):
+        stats = CustomerStats.objects.in_bulk(keys)
+        return [stats.get(key) for key in keys]
+
+    def _load_orders_by_customer(self, keys):
+        grouped = defaultdict(list)
+        orders = Order.objects.filter(customer_id__in=keys).order_by('id')
+        for order in orders:
+            grouped[order.customer_id].append(order)
+        self.track(orders)
+        return [grouped[key] for key in keys]
+
+    def _load_products_by_order(self, keys):
+        grouped = defaultdict(list)
+        through = Order.products.through.objects.filter(order_id__in=keys)
+        rows = list(through.select_related('product').order_by('order_id', 'product_id'))
+        for row in rows:
+            grouped[row.order_id].append(row.product)
+        self.track(row.product for row in rows)
+        return [grouped[key] for key in keys]
+
+    def _load_orders_by_product(self, keys):
+        grouped = defaultdict(list)
+        through = Order.products.through.objects.filter(product_id__in=keys)
+        rows = list(through.select_related('order').order_by('product_id', 'order_id'))
+        for row in rows:
+            grouped[row.product_id].append(row.order)
+        self.track(row.order for row in rows)
+        return [grouped[key] for key in keys]
+
+
+def get_loaders(info):
+    context = info.context
+    loader_class = AsyncDataLoader if in_event_loop() else DataLoader
+    if context is None:
+        return Loaders(loader_class)
+    loaders = getattr(context, 'crm_loaders', None)
+    if loaders is None:
+        loaders = Loaders(loader_class)
+        setattr(context, 'crm_loaders', loaders)
+    return loaders
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from crm.schema import schema
+
+MUTATION = """
+mutation($input: [CustomerInput]!) {
+  bulkCreateCustomers(input: $input) { errors }
+}
+"""
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time the bulkCreateCustomers mutation at several batch sizes (changes are rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1_000, 10_000, 100_000])
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            records = [
+                {"name": f"Bench {i}", "email": f"bench{i}@example.com", "phone": "123-456-7890"}
+                for i in range(size)
+            ]
+            # Every tenth email repeats the previous one to exercise the duplicate path.
+            for i in range(9, size, 10):
+                records[i]["email"] = records[i - 1]["email"]
+
+            try:
+                with transaction.atomic(), CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    result = schema.execute(MUTATION, variable_values={"input": records})
+                    elapsed = time.perf_counter() - start
+                    raise Rollback
+            except Rollback:
+                pass
+
+            if result.errors:
+                raise result.errors[0]
+            errors = len(result.data["bulkCreateCustomers"]["errors"])
+            self.stdout.write(
+                f"{size:>8} rows  {elapsed:8.2f}s  {size / elapsed:>10.0f} rows/s  "
+                f"{len(ctx.captured_queries):>5} queries  {errors} rejected"
+            )
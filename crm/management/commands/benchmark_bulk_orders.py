@@ -0,0 +1,90 @@
+import random
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from crm.models import Customer, Product
+from crm.schema import schema
+
+CREATE_ORDER = """
+mutation($customerId: ID!, $productIds: [ID]!) {
+  createOrder(customerId: $customerId, productIds: $productIds) { message }
+}
+"""
+
+BULK_CREATE_ORDERS = """
+mutation($input: [OrderInput]!) {
+  bulkCreateOrders(input: $input) { orders { id } errors }
+}
+"""
+
+
+class Rollback(Exception):
+    pass
+
+
+def restock(needed):
+    # Both paths start from exactly the stock their orders take, so neither
+    # is timed refusing orders the other one placed.
+    for pk, units in needed.items():
+        Product.objects.filter(pk=pk).update(stock=units)
+
+
+class Command(BaseCommand):
+    help = "Compare looping createOrder against one bulkCreateOrders call (changes are rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1_000, 10_000])
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    customers = Customer.objects.bulk_create(
+                        Customer(name=f"Bench {i}", email=f"bench-orders-{i}@example.com") for i in range(100)
+                    )
+                    products = Product.objects.bulk_create(
+                        Product(name=f"Bench {i}", price=Decimal("9.99"), stock=0) for i in range(50)
+                    )
+                    records = [
+                        {
+                            "customerId": rng.choice(customers).pk,
+                            "productIds": [p.pk for p in rng.sample(products, 3)],
+                        }
+                        for _ in range(size)
+                    ]
+                    needed = Counter(pk for record in records for pk in record["productIds"])
+
+                    restock(needed)
+                    start = time.perf_counter()
+                    for record in records:
+                        result = schema.execute(CREATE_ORDER, variable_values=record)
+                        if result.errors:
+                            raise result.errors[0]
+                        if result.data['createOrder']['message'] != "Order created successfully.":
+                            raise CommandError(f"createOrder refused an order: {result.data['createOrder']['message']}")
+                    looped = time.perf_counter() - start
+
+                    restock(needed)
+                    start = time.perf_counter()
+                    result = schema.execute(BULK_CREATE_ORDERS, variable_values={"input": records})
+                    bulk = time.perf_counter() - start
+                    if result.errors:
+                        raise result.errors[0]
+                    created, errors = result.data['bulkCreateOrders']['orders'], result.data['bulkCreateOrders']['errors']
+                    if errors or len(created) != size:
+                        raise CommandError(
+                            f"bulkCreateOrders placed {len(created)} of {size} orders: {'; '.join(errors[:3])}"
+                        )
+                    raise Rollback
+            except Rollback:
+                pass
+
+            self.stdout.write(
+                f"{size:>8} orders  createOrder {size / looped:>9.0f}/s  "
+                f"bulkCreateOrders {size / bulk:>9.0f}/s  speedup {looped / bulk:5.1f}x"
+            )
@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.benchmarks import OPERATIONS, Runner, compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the GraphQL endpoint's hot operations in-process over several dataset sizes "
+        "(all changes are rolled back)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1_000, 10_000], help="Customers in the dataset.")
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--operations', nargs='+', choices=[op.name for op in OPERATIONS])
+        parser.add_argument('--with-cache', action='store_true', help="Keep the resolver cache on.")
+        parser.add_argument('--save', metavar='PATH', help="Write the results to a baseline JSON file.")
+        parser.add_argument('--baseline', metavar='PATH', help="Diff the results against a saved baseline.")
+        parser.add_argument('--threshold', type=float, default=0.10, help="Relative change counted as a regression.")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        operations = [op for op in OPERATIONS if not options['operations'] or op.name in options['operations']]
+        runner = Runner(options['iterations'], options['warmup'], options['with_cache'])
+        results = runner.run(options['sizes'], operations, progress=self.report)
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Saved results to {options['save']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = 0
+            for size, name, metric, before, after, change, regressed in compare(results, baseline, options['threshold']):
+                regressions += regressed
+                line = f"{size:>8} {name:<24} {metric:<14} {before:>12.2f} -> {after:>12.2f} {change:>+8.1%}"
+                self.stdout.write(self.style.ERROR(line + "  REGRESSION") if regressed else line)
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{regressions} metric(s) regressed by more than {options['threshold']:.0%}.")
+
+    def report(self, size, name, metrics):
+        self.stdout.write(
+            f"{size:>8} {name:<24} {metrics['ops_per_sec']:>9.1f} ops/s  "
+            f"p50 {metrics['p50_ms']:7.2f} ms  p95 {metrics['p95_ms']:7.2f} ms  p99 {metrics['p99_ms']:7.2f} ms  "
+            f"{metrics['sql_queries']:>3} queries  peak {metrics['peak_memory_kb']:>8.0f} KiB"
+        )
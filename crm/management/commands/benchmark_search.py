@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.models import Customer, Product
+from crm.search import contains, indexed, search
+
+# (model, field, term): common and rare substrings in generate_crm_data's rows
+CASES = [
+    (Customer, 'name', 'alice'),
+    (Customer, 'name', 'ce smi'),
+    (Customer, 'email', 'smith.1234'),
+    (Customer, 'email', 'alice.hall.98765@'),
+    (Customer, 'email', 'nomatch'),
+    (Customer, 'email', 'al'),
+    (Product, 'name', 'laptop 12'),
+]
+
+
+class Command(BaseCommand):
+    help = "Time the trigram-indexed name/email filters and search() against plain icontains on the current data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--first', type=int, default=20, help="Page size for the first-page timings.")
+
+    def timed(self, run, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = run()
+            best = min(best, time.perf_counter() - start)
+        return result, best * 1000
+
+    def handle(self, *args, **options):
+        repeat, first = options['repeat'], options['first']
+        for model in (Customer, Product):
+            self.stdout.write(
+                f"{model.__name__}: {model.objects.count()} rows, "
+                f"{'trigram index' if indexed(model) else 'no index, falling back to icontains'}"
+            )
+        self.stdout.write(
+            f"{'field':<14} {'term':<18} {'matches':>8}  {'icontains count':>15} {'indexed count':>13}  "
+            f"{'icontains page':>14} {'indexed page':>12}  {'search':>8}  (best of {repeat}, ms)"
+        )
+        for model, field, term in CASES:
+            scan = model.objects.filter(**{f'{field}__icontains': term})
+            fts = contains(model.objects.all(), field, term)
+            matches, scan_count = self.timed(scan.count, repeat)
+            _, fts_count = self.timed(fts.count, repeat)
+            _, scan_page = self.timed(lambda: list(scan.order_by('pk')[:first]), repeat)
+            _, fts_page = self.timed(lambda: list(fts.order_by('pk')[:first]), repeat)
+            _, ranked = self.timed(lambda: search(term, limit=first), repeat)
+            self.stdout.write(
+                f"{model.__name__.lower() + '.' + field:<14} {term:<18} {matches:>8}  {scan_count:>15.1f} "
+                f"{fts_count:>13.1f}  {scan_page:>14.1f} {fts_page:>12.1f}  {ranked:>8.1f}"
+            )
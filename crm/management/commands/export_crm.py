@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.export import CHUNK_SIZE, ENCODERS, EXPORTS, ExportError, export
+
+
+class Command(BaseCommand):
+    help = "Stream orders or customers to CSV/NDJSON with constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(ENCODERS), default='csv')
+        parser.add_argument('--output', '-o', help="File to write; defaults to stdout.")
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='NAME=VALUE',
+            help="OrderFilter/CustomerFilter filter, e.g. total_amount__gte=100. Repeatable.",
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        filters = {}
+        for item in options['filter']:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"Filters look like name=value, got {item!r}.")
+            filters[name] = value
+
+        try:
+            lines = export(options['kind'], options['format'], filters, options['chunk_size'])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from crm.bulk import CHUNK_SIZE
+from crm.factories import ORDER_DISTRIBUTIONS, create_dataset
+from crm.models import Customer, Product
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic synthetic dataset of customers, products and orders for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=10_000)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--orders-per-customer', type=float, default=3, help="Mean orders per customer.")
+        parser.add_argument('--order-distribution', choices=sorted(ORDER_DISTRIBUTIONS), default='poisson')
+        parser.add_argument(
+            '--products-per-order', type=int, nargs=2, default=[1, 3], metavar=('MIN', 'MAX'),
+        )
+        parser.add_argument('--days', type=int, default=365, help="Spread order dates over this many days.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE * 4)
+        parser.add_argument(
+            '--offset', type=int, default=None,
+            help="First customer and product number; defaults to the highest customer and product ids "
+                 "so reruns don't collide, even after deletes.",
+        )
+
+    def handle(self, *args, **options):
+        low, high = options['products_per_order']
+        if not 1 <= low <= high:
+            raise CommandError("--products-per-order needs 1 <= MIN <= MAX.")
+        if options['orders_per_customer'] < 0:
+            raise CommandError("--orders-per-customer cannot be negative.")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        offset = product_offset = options['offset']
+        if offset is None:
+            # Every earlier run numbered its rows below the ids it left behind;
+            # a count shrinks on delete and would hand those numbers out again.
+            offset = Customer.objects.aggregate(last=Max('pk'))['last'] or 0
+            product_offset = Product.objects.aggregate(last=Max('pk'))['last'] or 0
+
+        start = time.perf_counter()
+        reported = [start]
+
+        def progress(totals):
+            now = time.perf_counter()
+            if now - reported[0] >= 5 or totals['customers'] == options['customers']:
+                reported[0] = now
+                self.stdout.write(
+                    f"{totals['customers']:>10} customers {totals['orders']:>10} orders "
+                    f"{totals['orders'] / (now - start):>9.0f} orders/s"
+                )
+
+        totals = create_dataset(
+            customers=options['customers'],
+            products=options['products'],
+            orders_per_customer=options['orders_per_customer'],
+            products_per_order=(low, high),
+            seed=options['seed'],
+            days=options['days'],
+            order_distribution=options['order_distribution'],
+            offset=offset,
+            product_offset=product_offset,
+            chunk_size=options['chunk_size'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {totals['customers']} customers, {totals['products']} products and "
+            f"{totals['orders']} orders in {time.perf_counter() - start:.1f}s."
+        ))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.bulk import CHUNK_SIZE
+from crm.imports import IMPORTS, ImportFileError, import_csv
+
+
+class Command(BaseCommand):
+    help = "Stream customers or products from CSV, upserting by email (customers) or name (products)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTS))
+        parser.add_argument('path', help="CSV file with a header row.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE * 10)
+        parser.add_argument('--rejects', help="Where to write rejected rows; defaults to <path>.rejects.csv.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and count without writing.")
+
+    def handle(self, *args, **options):
+        rejects_path = options['rejects'] or f"{options['path']}.rejects.csv"
+        totals = {'rows': 0, 'created': 0, 'updated': 0, 'rejected': 0}
+        start = time.perf_counter()
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as source, \
+                    open(rejects_path, 'w', newline='') as rejects:
+                chunks = import_csv(
+                    options['kind'], source, rejects, options['chunk_size'], options['dry_run'],
+                )
+                for number, stats in enumerate(chunks, 1):
+                    for key in totals:
+                        totals[key] += stats[key]
+                    self.stdout.write(
+                        f"chunk {number:>5}: {stats['rows']:>7} rows {stats['created']:>7} created "
+                        f"{stats['updated']:>7} updated {stats['rejected']:>7} rejected "
+                        f"{stats['rows'] / max(stats['seconds'], 1e-9):>9.0f} rows/s"
+                    )
+        except (OSError, UnicodeDecodeError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        verb = "Would import" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {totals['rows']} rows in {time.perf_counter() - start:.1f}s: {totals['created']} created, "
+            f"{totals['updated']} updated, {totals['rejected']} rejected."
+        ))
+        if totals['rejected']:
+            self.stdout.write(f"Rejected rows written to {rejects_path}.")
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test import AsyncRequestFactory, RequestFactory
+
+from crm.caching import resolver_cache
+from crm.schema import schema
+from crm.tracing import percentile
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView
+
+QUERY = """
+{
+  orders(first: 50) {
+    edges { node { id totalAmount customer { name email } products { name price } } }
+  }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent GraphQL throughput of the sync (WSGI) and async (ASGI) views in-process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 10, 50])
+        parser.add_argument('--query', default=QUERY)
+        parser.add_argument(
+            '--with-cache', action='store_true',
+            help="Keep the resolver cache on; by default every request hits the database.",
+        )
+
+    def handle(self, *args, **options):
+        body = json.dumps({"query": options['query']})
+        backend = resolver_cache.backend
+        if not options['with_cache']:
+            resolver_cache.backend = None
+        try:
+            for concurrency in options['concurrency']:
+                wsgi = self.run_wsgi(body, options['requests'], concurrency)
+                asgi = async_to_sync(self.run_asgi)(body, options['requests'], concurrency)
+                for name, (elapsed, latencies) in (("WSGI", wsgi), ("ASGI", asgi)):
+                    self.stdout.write(
+                        f"{name} c={concurrency:<4} {options['requests'] / elapsed:>8.0f} req/s  "
+                        f"p50 {percentile(latencies, 50) * 1000:7.1f} ms  "
+                        f"p95 {percentile(latencies, 95) * 1000:7.1f} ms"
+                    )
+        finally:
+            resolver_cache.backend = backend
+
+    def run_wsgi(self, body, requests, concurrency):
+        view = CRMGraphQLView.as_view(schema=schema)
+        factory = RequestFactory()
+
+        def one(_):
+            start = time.perf_counter()
+            response = view(factory.post('/graphql', body, content_type='application/json'))
+            self.check_response(response)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(one, range(requests)))
+        return time.perf_counter() - start, latencies
+
+    async def run_asgi(self, body, requests, concurrency):
+        view = AsyncCRMGraphQLView.as_view(schema=schema)
+        factory = AsyncRequestFactory()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with slots:
+                start = time.perf_counter()
+                response = await view(factory.post('/graphql', body, content_type='application/json'))
+                self.check_response(response)
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - start, latencies
+
+    def check_response(self, response):
+        payload = json.loads(response.content)
+        if response.status_code != 200 or payload.get('errors'):
+            raise RuntimeError(payload)
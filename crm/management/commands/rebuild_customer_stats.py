@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import customer_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute every CustomerStats row from the orders, in customer id-range batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000, help="Customer ids per batch.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        def progress(last_id, rows):
+            self.stdout.write(f"Rebuilt {rows} customer summaries (up to customer id {last_id})")
+
+        rows = customer_stats.rebuild(options['batch_size'], progress)
+        self.stdout.write(self.style.SUCCESS(f"Done: {rows} customer summaries rebuilt."))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from crm import customer_stats
+from crm.caching import invalidate
+from crm.models import Order
+
+
+class Command(BaseCommand):
+    help = "Recompute Order.total_amount from current product prices in id-range batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        through = Order.products.through
+        product_total = (
+            through.objects.filter(order_id=OuterRef('pk'))
+            .values('order_id')
+            .annotate(total=Sum('product__price'))
+            .values('total')
+        )
+        total = Coalesce(
+            Subquery(product_total, output_field=DecimalField(max_digits=10, decimal_places=2)),
+            Value(0),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                Order.objects.filter(pk__gt=last_id)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # One UPDATE ... SET total_amount = (SELECT SUM(...)) per batch
+            with transaction.atomic():
+                updated += Order.objects.filter(pk__gte=ids[0], pk__lte=ids[-1]).update(total_amount=total)
+            last_id = ids[-1]
+            self.stdout.write(f"Recomputed {updated} order totals (up to id {last_id})")
+
+        invalidate(Order)
+        # Spend is summed from the totals just rewritten
+        rows = customer_stats.rebuild(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Done: {updated} orders recomputed, {rows} customer summaries rebuilt."))
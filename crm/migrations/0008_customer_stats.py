@@ -0,0 +1,51 @@
+# Generated by Django 4.2.11 on 2026-10-18 18:44
+
+from itertools import islice
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill(apps, schema_editor):
+    Order = apps.get_model('crm', 'Order')
+    CustomerStats = apps.get_model('crm', 'CustomerStats')
+    rows = (
+        Order.objects.values('customer_id')
+        .annotate(
+            order_count=models.Count('id'),
+            total_spent=models.Sum('total_amount'),
+            first_order_date=models.Min('order_date'),
+            last_order_date=models.Max('order_date'),
+        )
+        .order_by('customer_id')
+        .iterator(chunk_size=2000)
+    )
+    while True:
+        chunk = [CustomerStats(**row) for row in islice(rows, 2000)]
+        if not chunk:
+            break
+        CustomerStats.objects.bulk_create(chunk, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_order_reminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='crm.customer')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('first_order_date', models.DateTimeField()),
+                ('last_order_date', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['total_spent', 'customer'], name='crm_stats_spent_idx'), models.Index(fields=['order_count', 'customer'], name='crm_stats_count_idx'), models.Index(fields=['last_order_date', 'customer'], name='crm_stats_last_order_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:20
+
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from crm import search
+
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from crm import search
+
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0008_customer_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='crm_product_price_idx',
+        ),
+    ]
@@ -1,22 +1,79 @@
 from django.db import models
+from django.utils import timezone
 
 class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
-    phone = models.CharField(max_length=20, blank=True, null=True)
+    phone = models.CharField(max_length=20, blank=True, null=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Serves createdAt filters and the inactive-customer cleanup's id bounds.
+            models.Index(fields=['created_at', 'id'], name='crm_customer_created_id_idx'),
+        ]
 
 class Product(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Serves updateLowStockProducts' `stock < threshold` update.
+            models.Index(fields=['stock'], name='crm_product_stock_idx'),
+        ]
+
 class Order(models.Model):
     customer = models.ForeignKey('Customer', on_delete=models.CASCADE)
     products = models.ManyToManyField('Product')  # <== Simple M2M
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
-    order_date = models.DateTimeField(auto_now_add=True)
+    order_date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Serves orderDate filters and the (order_date, id) keyset cursor.
+            models.Index(fields=['order_date', 'id'], name='crm_order_date_id_idx'),
+            models.Index(fields=['total_amount'], name='crm_order_total_idx'),
+        ]
 
     def calculate_total(self):
-        self.total_amount = sum(p.price for p in self.products.all())
-        self.save()
+        # Full recompute; day-to-day changes are applied incrementally by crm/signals.py
+        self.total_amount = self.products.aggregate(total=models.Sum('price'))['total'] or 0
+        self.save(update_fields=['total_amount'])
+
+
+class CustomerStats(models.Model):
+    """Per-customer order summary, maintained by crm/customer_stats.py; exists only for customers with orders."""
+    customer = models.OneToOneField('Customer', on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    order_count = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    first_order_date = models.DateTimeField()
+    last_order_date = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Each serves one customerStats ordering (and its range filter) with the keyset tie-break.
+            models.Index(fields=['total_spent', 'customer'], name='crm_stats_spent_idx'),
+            models.Index(fields=['order_count', 'customer'], name='crm_stats_count_idx'),
+            models.Index(fields=['last_order_date', 'customer'], name='crm_stats_last_order_idx'),
+        ]
+
+class OrderReminder(models.Model):
+    """Outbox row for one order's reminder; ``idempotency_key`` makes enqueueing repeatable."""
+    PENDING = 'pending'
+    SENT = 'sent'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent')]
+
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    order = models.ForeignKey('Order', on_delete=models.CASCADE)
+    customer = models.ForeignKey('Customer', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Serves the dispatcher's pending-by-customer walk.
+            models.Index(fields=['status', 'customer', 'id'], name='crm_reminder_status_idx'),
+        ]
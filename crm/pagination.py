@@ -0,0 +1,182 @@
+"""
+Keyset (seek) pagination for Relay connections.
+
+Cursors encode the values of the connection's ordering columns for the last
+row seen, so fetching the next page is ``WHERE (order_date, id) > (...)
+ORDER BY order_date, id LIMIT n + 1`` rather than an OFFSET scan: page N costs
+the same as page 1 and no ``COUNT(*)`` is issued.
+
+Fields given ``cache_models`` keep fetched pages in the resolver cache
+(crm/caching.py) until one of those models changes. On an event loop (the
+async view) the page is fetched with async queryset iteration and the
+resolver returns a coroutine.
+"""
+import base64
+import json
+from functools import partial
+
+from django.db.models import F, Q
+from graphene import Dynamic
+from graphene.relay import PageInfo
+from graphene_django import DjangoConnectionField
+from graphene_django.filter import DjangoFilterConnectionField
+from graphql import GraphQLError
+
+from .caching import resolver_cache
+from .loaders import get_loaders, in_event_loop
+
+
+def encode_cursor(values):
+    payload = json.dumps([str(value) for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, fields):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(fields):
+            raise ValueError(cursor)
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except Exception:
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+
+
+def keyset_filter(ordering, values, backwards=False):
+    """Q object selecting the rows strictly after ``values`` in ``ordering``."""
+    condition = Q()
+    for i, name in reversed(list(enumerate(ordering))):
+        descending = name.startswith('-') != backwards
+        field = name.lstrip('-')
+        lookup = 'lt' if descending else 'gt'
+        step = Q(**{f"{field}__{lookup}": values[i]})
+        if i < len(ordering) - 1:
+            step |= Q(**{field: values[i]}) & condition
+        condition = step
+    return condition
+
+
+def reverse_ordering(ordering):
+    return [name[1:] if name.startswith('-') else f"-{name}" for name in ordering]
+
+
+class KeysetPaginationMixin:
+    """Paginate a DjangoConnectionField by keyset cursors instead of offsets."""
+
+    def __init__(self, *args, ordering=('id',), orderings=None, cache_models=(), **kwargs):
+        self.ordering = list(ordering)
+        # {sort_by enum value: ordering}; the field must declare sort_by.
+        self.orderings = {key: list(value) for key, value in (orderings or {}).items()}
+        self.cache_models = tuple(cache_models)
+        # Offsets are exactly what keyset pagination avoids; a Dynamic that
+        # resolves to None drops the argument DjangoConnectionField adds.
+        kwargs.setdefault('offset', Dynamic(lambda: None))
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def keyset_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        ordering,
+        orderings,
+        cache_models,
+        root,
+        info,
+        **args,
+    ):
+        sort_by = args.get('sort_by')
+        if sort_by is not None:
+            ordering = orderings[getattr(sort_by, 'value', sort_by)]
+        first = args.get('first')
+        last = args.get('last')
+        for name, value in (('first', first), ('last', last)):
+            if value is not None and not 0 <= value <= max_limit:
+                raise GraphQLError(
+                    f"`{name}` on the `{info.field_name}` connection must be between 0 and {max_limit}."
+                )
+
+        backwards = first is None and last is not None
+        page_size = last if backwards else (first if first is not None else max_limit)
+        cursor = args.get('before') if backwards else args.get('after')
+        keys = [f"keyset_{i}" for i in range(len(ordering))]
+
+        def page_queryset():
+            iterable = resolver(root, info, **args)
+            if iterable is None:
+                iterable = default_manager
+            queryset = queryset_resolver(connection, iterable, info, args)
+
+            model = queryset.model
+            fields = [model._meta.get_field(name.lstrip('-')) for name in ordering]
+            queryset = queryset.annotate(**{key: F(field.name) for key, field in zip(keys, fields)})
+            queryset = queryset.order_by(*(reverse_ordering(ordering) if backwards else ordering))
+            if cursor is not None:
+                queryset = queryset.filter(keyset_filter(ordering, decode_cursor(cursor, fields), backwards))
+            return queryset[:page_size + 1]
+
+        def page(rows):
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            if backwards:
+                rows.reverse()
+            return rows, has_more
+
+        def fetch():
+            return page(list(page_queryset()))
+
+        async def afetch():
+            return page([row async for row in page_queryset()])
+
+        def build(result):
+            rows, has_more = result
+            get_loaders(info).track(rows)
+            edges = [
+                connection.Edge(node=row, cursor=encode_cursor([getattr(row, key) for key in keys]))
+                for row in rows
+            ]
+            return connection(
+                edges=edges,
+                page_info=PageInfo(
+                    start_cursor=edges[0].cursor if edges else None,
+                    end_cursor=edges[-1].cursor if edges else None,
+                    has_previous_page=has_more if backwards else cursor is not None,
+                    has_next_page=cursor is not None if backwards else has_more,
+                ),
+            )
+
+        if in_event_loop():
+            async def resolve_async():
+                if cache_models:
+                    return build(await resolver_cache.aget_or_set(info, args, cache_models, afetch))
+                return build(await afetch())
+            return resolve_async()
+
+        if cache_models:
+            # Rows keep their prefetch caches, so a cached page resolves
+            # its nested fields without touching the database either.
+            return build(resolver_cache.get_or_set(info, args, cache_models, fetch))
+        return build(fetch())
+
+    def wrap_resolve(self, parent_resolver):
+        return partial(
+            self.keyset_resolver,
+            self.resolver or parent_resolver,
+            self.connection_type,
+            self.get_manager(),
+            self.get_queryset_resolver(),
+            self.max_limit,
+            self.ordering,
+            self.orderings,
+            self.cache_models,
+        )
+
+
+class KeysetConnectionField(KeysetPaginationMixin, DjangoConnectionField):
+    pass
+
+
+class KeysetFilterConnectionField(KeysetPaginationMixin, DjangoFilterConnectionField):
+    pass
@@ -0,0 +1,125 @@
+"""
+Selection-set driven queryset planning.
+
+``plan_queryset`` walks the fields a client asked for (following aliases,
+inline fragments and named fragments) and turns them into ``only()``
+columns, ``select_related`` joins for foreign keys and one-to-ones and
+``Prefetch`` objects, each planned the same way, for many-to-many and
+reverse relations.
+"""
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode, get_named_type
+
+
+class Plan:
+    def __init__(self):
+        self.only = set()
+        self.select_related = set()
+        self.prefetch = []
+        self.restrict_columns = True
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*self.prefetch)
+        if self.restrict_columns and self.only:
+            queryset = queryset.only(*sorted(self.only))
+        return queryset
+
+
+def plan_queryset(queryset, info):
+    """Restrict ``queryset`` to what the current field's selection set reads."""
+    selections = _field_selections(info.field_nodes, info.fragments)
+    if _is_connection(info.return_type):
+        edges = _field_selections(selections.get('edges', []), info.fragments)
+        selections = _field_selections(edges.get('node', []), info.fragments)
+    plan = Plan()
+    _plan_model(plan, queryset.model, selections, info.fragments, prefix='')
+    return plan.apply(queryset)
+
+
+def _is_connection(return_type):
+    named = get_named_type(return_type)
+    return 'edges' in getattr(named, 'fields', {}) and 'pageInfo' in named.fields
+
+
+def _field_selections(field_nodes, fragments):
+    """Map response field name -> list of FieldNodes selected under ``field_nodes``."""
+    selections = {}
+
+    def collect(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                selections.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, InlineFragmentNode):
+                collect(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = fragments.get(selection.name.value)
+                if fragment is not None:
+                    collect(fragment.selection_set)
+
+    for node in field_nodes:
+        collect(node.selection_set)
+    return selections
+
+
+def _model_fields(model):
+    fields = {}
+    for field in model._meta.get_fields():
+        if field.auto_created and not field.concrete:
+            fields[field.get_accessor_name()] = field
+        else:
+            fields[field.name] = field
+    return fields
+
+
+def _plan_model(plan, model, selections, fragments, prefix):
+    fields = _model_fields(model)
+    plan.only.add(prefix + model._meta.pk.name)
+
+    for graphql_name, nodes in selections.items():
+        if graphql_name == '__typename':
+            continue
+        field = fields.get(to_snake_case(graphql_name))
+        if field is None:
+            # A computed field may read any column, so fetch them all.
+            plan.restrict_columns = False
+            continue
+
+        if not field.is_relation:
+            plan.only.add(prefix + field.attname)
+        elif (field.many_to_one and field.concrete) or field.one_to_one:
+            # Single-valued relations, reverse one-to-one included, join in.
+            path = prefix + field.name
+            if field.concrete:
+                plan.only.add(path)
+            plan.select_related.add(path)
+            nested = _field_selections(nodes, fragments)
+            _plan_model(plan, field.related_model, nested, fragments, prefix=path + '__')
+        else:
+            nested = _field_selections(nodes, fragments)
+            plan.prefetch.append(_plan_prefetch(field, prefix, nested, fragments))
+
+
+def _plan_prefetch(field, prefix, selections, fragments):
+    related_model = field.related_model
+    inner = Plan()
+    _plan_model(inner, related_model, selections, fragments, prefix='')
+    if field.one_to_many:
+        # Prefetching a reverse FK matches rows on the FK column.
+        inner.only.add(field.field.attname)
+    accessor = field.get_accessor_name() if not field.concrete else field.name
+    return Prefetch(prefix + accessor, queryset=inner.apply(related_model._default_manager.all()))
+
+
+def prefetched(instance, accessor):
+    """Return the planned prefetch for ``accessor``, or None if it was not planned."""
+    queryset = getattr(instance, accessor).all()
+    if queryset._result_cache is None:
+        return None
+    return list(queryset)
+
@@ -0,0 +1,148 @@
+"""
+Order reminders through an outbox.
+
+``enqueue_reminders`` pages the last ``DAYS`` days of orders in
+``(order_date, id)`` keyset chunks and inserts one ``OrderReminder`` per
+order with ``bulk_create(ignore_conflicts=True)``; the unique idempotency
+key is derived from the order, so rerunning never queues an order twice.
+``dispatch_reminders`` walks the pending rows by customer and hands them to
+Celery ``BATCH_SIZE`` at a time, never splitting one customer across tasks;
+``send_reminders`` (the task body) sends one message per customer and marks
+the rows sent. Settings live in ``CRM_REMINDERS``; with
+``CELERY_BROKER_URL = 'memory://'`` everything runs on the in-process broker.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderReminder
+from .pagination import keyset_filter
+
+DEFAULTS = {
+    'DAYS': 7,
+    'CHUNK_SIZE': 2000,
+    'BATCH_SIZE': 500,
+    'LOG_FILE': '/tmp/order_reminders_log.txt',
+}
+
+
+def reminder_settings():
+    return {**DEFAULTS, **getattr(settings, 'CRM_REMINDERS', {})}
+
+
+def idempotency_key(order_id):
+    return f"order-reminder:{order_id}"
+
+
+def insert_reminders(rows, batch_size=None):
+    """Create pending reminders for ``(key, order_id, customer_id)`` rows, skipping taken keys.
+
+    The unique ``idempotency_key`` does the skipping: a conflicting row is
+    dropped by the INSERT itself, so concurrent enqueues cannot double-queue.
+    """
+    OrderReminder.objects.bulk_create(
+        [
+            OrderReminder(idempotency_key=key, order_id=order_id, customer_id=customer_id)
+            for key, order_id, customer_id in rows
+        ],
+        batch_size=batch_size or reminder_settings()['CHUNK_SIZE'],
+        ignore_conflicts=True,
+    )
+
+
+def enqueue_reminders(days=None, chunk_size=None, now=None):
+    """Queue a reminder for every order in the last ``days``; returns how many rows the outbox gained."""
+    config = reminder_settings()
+    days = config['DAYS'] if days is None else days
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+    since = (now or timezone.now()) - timedelta(days=days)
+
+    ordering = ('order_date', 'id')
+    orders = Order.objects.filter(order_date__gte=since).order_by(*ordering)
+    # Conflicting inserts are dropped silently, so count the outbox rather than the inserts.
+    before = OrderReminder.objects.count()
+    last = None
+    while True:
+        page = orders if last is None else orders.filter(keyset_filter(ordering, last))
+        chunk = list(page.values_list('order_date', 'id', 'customer_id')[:chunk_size])
+        if not chunk:
+            break
+        insert_reminders(
+            [(idempotency_key(order_id), order_id, customer_id) for _, order_id, customer_id in chunk], chunk_size,
+        )
+        last = chunk[-1][:2]
+    return OrderReminder.objects.count() - before
+
+
+def pending_batches(batch_size=None, chunk_size=None):
+    """Lists of pending reminder ids, about ``batch_size`` long, each holding whole customers."""
+    config = reminder_settings()
+    batch_size = batch_size or config['BATCH_SIZE']
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+
+    ordering = ('customer_id', 'id')
+    pending = OrderReminder.objects.filter(status=OrderReminder.PENDING).order_by(*ordering)
+    batch = []
+    last = None
+    while True:
+        page = pending if last is None else pending.filter(keyset_filter(ordering, last))
+        chunk = list(page.values_list(*ordering)[:chunk_size])
+        if not chunk:
+            break
+        for customer_id, reminder_id in chunk:
+            # Only cut between customers, so one customer's orders share a message.
+            if len(batch) >= batch_size and customer_id != last[0]:
+                yield [pk for _, pk in batch]
+                batch = []
+            batch.append((customer_id, reminder_id))
+            last = (customer_id, reminder_id)
+    if batch:
+        yield [pk for _, pk in batch]
+
+
+def dispatch_reminders(batch_size=None):
+    """Send each pending batch to ``send_order_reminders``; returns the number of tasks."""
+    from .tasks import send_order_reminders
+
+    tasks = 0
+    for ids in pending_batches(batch_size):
+        send_order_reminders.delay(ids)
+        tasks += 1
+    return tasks
+
+
+def send_reminders(reminder_ids, log_file=None):
+    """Send the still-pending reminders among ``reminder_ids``; returns the number of messages.
+
+    Rows are locked (``SKIP LOCKED`` where supported) so a batch dispatched
+    twice is only sent once.
+    """
+    log_file = log_file or reminder_settings()['LOG_FILE']
+    timestamp = timezone.now().strftime("[%Y-%m-%d %H:%M:%S]")
+    with transaction.atomic():
+        reminders = list(
+            OrderReminder.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(pk__in=reminder_ids, status=OrderReminder.PENDING)
+            .select_related('customer')
+            .order_by('customer_id', 'order_id')
+        )
+        if not reminders:
+            return 0
+        messages = 0
+        with open(log_file, "a") as f:
+            for customer, group in groupby(reminders, key=lambda reminder: reminder.customer):
+                order_ids = ", ".join(str(reminder.order_id) for reminder in group)
+                f.write(f"{timestamp} Customer Email: {customer.email}, Order IDs: {order_ids}\n")
+                messages += 1
+        OrderReminder.objects.filter(pk__in=[reminder.pk for reminder in reminders]).update(
+            status=OrderReminder.SENT, sent_at=timezone.now(),
+        )
+    return messages
+
+
+def queue_order_reminders():
+    """Enqueue the recent orders and dispatch everything pending; returns ``(queued, tasks)``."""
+    return enqueue_reminders(), dispatch_reminders()
@@ -0,0 +1,81 @@
+"""
+Database-side aggregates for CRM reporting.
+
+Every figure is computed with ``aggregate()``/``annotate()`` so the cost of a
+report is a handful of queries returning a few rows, independent of how many
+customers and orders exist.
+"""
+from decimal import Decimal
+
+from django.db.models import Avg, Count, F, Sum
+from django.db.models.functions import TruncDay, TruncWeek
+
+from .models import Customer, CustomerStats, Order
+
+GROUPINGS = {
+    'day': TruncDay('order_date'),
+    'week': TruncWeek('order_date'),
+    'customer': F('customer_id'),
+}
+
+
+def _money(value):
+    return (value or Decimal('0')).quantize(Decimal('0.01'))
+
+
+def crm_stats(group_by=None, limit=100):
+    totals = Order.objects.aggregate(
+        order_count=Count('id'),
+        revenue=Sum('total_amount'),
+        average_order_value=Avg('total_amount'),
+    )
+    stats = {
+        'customer_count': Customer.objects.count(),
+        'order_count': totals['order_count'],
+        'revenue': _money(totals['revenue']),
+        'average_order_value': _money(totals['average_order_value']),
+        'groups': [],
+    }
+    if group_by is None:
+        return stats
+    if group_by == 'customer':
+        stats['groups'] = _customer_groups(limit)
+        return stats
+
+    rows = (
+        Order.objects.annotate(key=GROUPINGS[group_by])
+        .values('key')
+        .annotate(
+            order_count=Count('id'),
+            revenue=Sum('total_amount'),
+            average_order_value=Avg('total_amount'),
+        )
+    )
+    stats['groups'] = [
+        {
+            'key': row['key'].isoformat() if hasattr(row['key'], 'isoformat') else str(row['key']),
+            'order_count': row['order_count'],
+            'revenue': _money(row['revenue']),
+            'average_order_value': _money(row['average_order_value']),
+        }
+        # The most recent `limit` periods, oldest first
+        for row in reversed(rows.order_by('-key')[:limit])
+    ]
+    return stats
+
+
+def _customer_groups(limit):
+    # Busiest customers first, read off the CustomerStats spend index
+    # instead of aggregating every order.
+    rows = CustomerStats.objects.order_by('-total_spent', 'customer_id').values_list(
+        'customer_id', 'order_count', 'total_spent'
+    )
+    return [
+        {
+            'key': str(customer_id),
+            'order_count': order_count,
+            'revenue': _money(total_spent),
+            'average_order_value': _money(total_spent / order_count),
+        }
+        for customer_id, order_count, total_spent in rows[:limit]
+    ]
@@ -1,31 +1,123 @@
 import graphene
 from graphene_django import DjangoObjectType
+from graphql import GraphQLError
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
+from .models import Customer, CustomerStats, Product, Order
+from .bulk import bulk_create_customers, bulk_create_orders, order_product_ids
+from .caching import cached_resolver
+from .loaders import get_loaders
+from .filters import CustomerFilter, CustomerStatsFilter, ProductFilter, OrderFilter
+from .pagination import KeysetFilterConnectionField
+from .planner import plan_queryset, prefetched
+from .reports import crm_stats
+from .search import search
+from .stock import InsufficientStock, reserve_stock, restock_low_stock
+from .validators import validate_phone
 from django.db import transaction
-import re
-from .models import Customer, Product, Order
-from datetime import datetime
+from django.utils import timezone
 
 # DjangoObjectTypes
-class CustomerType(DjangoObjectType):
+# get_queryset plans only()/select_related/prefetch_related from the selection
+# set (crm/planner.py). Relations the plan did not prefetch fall back to the
+# per-request DataLoaders in crm/loaders.py, so nested lists cost one query
+# per relation rather than one per parent row.
+class PlannedObjectType(DjangoObjectType):
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        return plan_queryset(queryset, info)
+
+class CustomerType(PlannedObjectType):
+    order_set = graphene.List(graphene.NonNull(lambda: OrderType), required=True)
+    stats = graphene.Field(lambda: CustomerStatsType)
+
     class Meta:
         model = Customer
+        use_connection = True
+
+    def resolve_stats(self, info):
+        if Customer.stats.is_cached(self):
+            # select_related caches None for customers without orders
+            return self._state.fields_cache['stats']
+        return get_loaders(info).stats_by_customer_id.load(self.pk)
+
+    def resolve_order_set(self, info):
+        orders = prefetched(self, 'order_set')
+        if orders is not None:
+            return get_loaders(info).track(orders)
+        return get_loaders(info).orders_by_customer_id.load(self.pk)
+
+class ProductType(PlannedObjectType):
+    order_set = graphene.List(graphene.NonNull(lambda: OrderType), required=True)
 
-class ProductType(DjangoObjectType):
     class Meta:
         model = Product
+        use_connection = True
+
+    def resolve_order_set(self, info):
+        orders = prefetched(self, 'order_set')
+        if orders is not None:
+            return get_loaders(info).track(orders)
+        return get_loaders(info).orders_by_product_id.load(self.pk)
+
+class OrderType(PlannedObjectType):
+    customer = graphene.Field(CustomerType, required=True)
+    products = graphene.List(graphene.NonNull(ProductType), required=True)
 
-class OrderType(DjangoObjectType):
     class Meta:
         model = Order
+        use_connection = True
+
+    def resolve_customer(self, info):
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customer_by_id.load(self.customer_id)
 
-# Validation helper for phone
-def validate_phone(phone):
-    if phone is None:
-        return True
-    pattern = re.compile(r'^(\+?\d{1,3}[- ]?)?(\d{3}[- ]?\d{3}[- ]?\d{4})$')
-    return pattern.match(phone)
+    def resolve_products(self, info):
+        products = prefetched(self, 'products')
+        if products is not None:
+            return get_loaders(info).track(products)
+        return get_loaders(info).products_by_order_id.load(self.pk)
+
+class CustomerStatsType(PlannedObjectType):
+    customer = graphene.Field(CustomerType, required=True)
+
+    class Meta:
+        model = CustomerStats
+        use_connection = True
+
+    def resolve_customer(self, info):
+        if CustomerStats.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customer_by_id.load(self.customer_id)
+
+# Orderings for the customerStats connection; each walks one CustomerStats index
+class CustomerStatsOrdering(graphene.Enum):
+    TOTAL_SPENT_DESC = 'total_spent_desc'
+    ORDER_COUNT_DESC = 'order_count_desc'
+    LAST_ORDER_DATE_DESC = 'last_order_date_desc'
+
+CUSTOMER_STATS_ORDERINGS = {
+    'total_spent_desc': ('-total_spent', '-customer'),
+    'order_count_desc': ('-order_count', '-customer'),
+    'last_order_date_desc': ('-last_order_date', '-customer'),
+}
+
+# Ranked search over customers and products (crm/search.py)
+class SearchKind(graphene.Enum):
+    CUSTOMER = 'customer'
+    PRODUCT = 'product'
+
+class SearchResult(graphene.Union):
+    class Meta:
+        types = (CustomerType, ProductType)
+
+class SearchHitType(graphene.ObjectType):
+    score = graphene.Float(required=True)
+    node = graphene.Field(SearchResult, required=True)
 
 # CreateCustomer mutation
 class CreateCustomer(graphene.Mutation):
@@ -68,25 +160,8 @@ class BulkCreateCustomers(graphene.Mutation):
     errors = graphene.List(graphene.String)
 
     def mutate(self, info, input):
-        created_customers = []
-        errors = []
-
-        with transaction.atomic():
-            for idx, cust_data in enumerate(input):
-                try:
-                    validate_email(cust_data.email)
-                    if Customer.objects.filter(email=cust_data.email).exists():
-                        raise ValueError("Email already exists")
-                    if cust_data.phone and not validate_phone(cust_data.phone):
-                        raise ValueError("Invalid phone format")
-
-                    customer = Customer(name=cust_data.name, email=cust_data.email, phone=cust_data.phone)
-                    customer.save()
-                    created_customers.append(customer)
-
-                except Exception as e:
-                    errors.append(f"Record {idx + 1}: {str(e)}")
-
+        # Validation, duplicate checks and inserts are set-based (crm/bulk.py)
+        created_customers, errors = bulk_create_customers(input)
         return BulkCreateCustomers(customers=created_customers, errors=errors)
 
 # CreateProduct mutation
@@ -104,6 +179,8 @@ class CreateProduct(graphene.Mutation):
             return CreateProduct(product=None, message="Price must be positive.")
         if stock < 0:
             return CreateProduct(product=None, message="Stock cannot be negative.")
+        if Product.objects.filter(name=name).exists():
+            return CreateProduct(product=None, message="Product already exists.")
 
         product = Product(name=name, price=price, stock=stock)
         product.save()
@@ -129,41 +206,74 @@ class CreateOrder(graphene.Mutation):
         if not product_ids:
             return CreateOrder(order=None, message="At least one product must be selected.")
 
-        products = Product.objects.filter(pk__in=product_ids)
+        product_ids = order_product_ids(product_ids)
+        products = list(Product.objects.filter(pk__in=[pk for pk in product_ids if pk is not None]))
         if len(products) != len(product_ids):
             return CreateOrder(order=None, message="One or more invalid product IDs.")
 
-        total_amount = sum(p.price for p in products)
-
         if order_date is None:
-            order_date = datetime.now()
+            order_date = timezone.now()
 
-        order = Order(customer=customer, order_date=order_date, total_amount=total_amount)
-        order.save()
-        order.products.set(products)
-        order.save()
+        try:
+            with transaction.atomic():
+                reserve_stock({product.pk: 1 for product in products})
+                # total_amount is maintained by the m2m_changed handler in crm/signals.py
+                order = Order(customer=customer, order_date=order_date)
+                order.save()
+                order.products.add(*products)
+        except InsufficientStock as e:
+            return CreateOrder(order=None, message=str(e))
 
         return CreateOrder(order=order, message="Order created successfully.")
 
+# BulkCreateOrders mutation
+class OrderInput(graphene.InputObjectType):
+    customer_id = graphene.ID(required=True)
+    product_ids = graphene.List(graphene.ID, required=True)
+    order_date = graphene.DateTime()
+
+class BulkCreateOrders(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(OrderInput, required=True)
+
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+
+    def mutate(self, info, input):
+        # Lookups, totals and inserts are set-based (crm/bulk.py)
+        created, errors = bulk_create_orders(input)
+
+        # Everything the payload can select is already in memory.
+        loaders = get_loaders(info)
+        for order, products in created:
+            loaders.customer_by_id.prime(order.customer_id, order.customer)
+            loaders.products_by_order_id.prime(order.pk, products)
+        return BulkCreateOrders(orders=[order for order, _ in created], errors=errors)
+
 # ✅ UpdateLowStockProducts mutation
 class UpdateLowStockProducts(graphene.Mutation):
+    class Arguments:
+        threshold = graphene.Int(required=False)
+        increment = graphene.Int(required=False)
+
+    products = graphene.List(ProductType)
     updated_products = graphene.List(graphene.String)
     success = graphene.String()
+    message = graphene.String()
 
-    def mutate(self, info):
-        # ✅ Queries products with stock < 10
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated_names = []
+    def mutate(self, info, threshold=10, increment=10):
+        if threshold < 0:
+            return UpdateLowStockProducts(products=[], updated_products=[], message="Threshold cannot be negative.")
+        if increment <= 0:
+            return UpdateLowStockProducts(products=[], updated_products=[], message="Increment must be positive.")
 
-        for product in low_stock_products:
-            # ✅ Increments their stock by 10
-            product.stock += 10
-            product.save()
-            updated_names.append(f"{product.name} ({product.stock})")
+        # ✅ One UPDATE ... SET stock = stock + increment WHERE stock < threshold
+        products = restock_low_stock(threshold=threshold, increment=increment)
 
         # ✅ Returns a list of updated products and a success message
         return UpdateLowStockProducts(
-            updated_products=updated_names,
+            products=products,
+            updated_products=[f"{product.name} ({product.stock})" for product in products],
             success="Stock updated successfully"
         )
 
@@ -173,21 +283,67 @@ class Mutation(graphene.ObjectType):
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
 
+# CRM reporting types (aggregated in the database, see crm/reports.py)
+class StatsGrouping(graphene.Enum):
+    DAY = 'day'
+    WEEK = 'week'
+    CUSTOMER = 'customer'
+
+class CRMStatsGroupType(graphene.ObjectType):
+    key = graphene.String()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+    average_order_value = graphene.Decimal()
+
+class CRMStatsType(graphene.ObjectType):
+    customer_count = graphene.Int()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+    average_order_value = graphene.Decimal()
+    groups = graphene.List(CRMStatsGroupType)
+
 # Query class
 class Query(graphene.ObjectType):
     hello = graphene.String(default_value="Hello, GraphQL!")
+    crm_stats = graphene.Field(CRMStatsType, group_by=StatsGrouping(), first=graphene.Int(default_value=100))
+    customers = KeysetFilterConnectionField(
+        CustomerType, filterset_class=CustomerFilter, cache_models=(Customer, Order, Product, CustomerStats)
+    )
+    customer_stats = KeysetFilterConnectionField(
+        CustomerStatsType, filterset_class=CustomerStatsFilter, sort_by=CustomerStatsOrdering(),
+        ordering=CUSTOMER_STATS_ORDERINGS['total_spent_desc'], orderings=CUSTOMER_STATS_ORDERINGS,
+        cache_models=(Customer, Order, Product, CustomerStats),
+    )
+    products = KeysetFilterConnectionField(
+        ProductType, filterset_class=ProductFilter, cache_models=(Customer, Order, Product, CustomerStats)
+    )
+    orders = KeysetFilterConnectionField(
+        OrderType, filterset_class=OrderFilter, ordering=('order_date', 'id'),
+        cache_models=(Customer, Order, Product, CustomerStats),
+    )
+
+    search = graphene.List(
+        graphene.NonNull(SearchHitType), required=True,
+        query=graphene.String(required=True), first=graphene.Int(default_value=20),
+        kinds=graphene.List(graphene.NonNull(SearchKind)),
+    )
+
+    @cached_resolver(Customer, Order, CustomerStats)
+    def resolve_crm_stats(self, info, group_by=None, first=100):
+        if first < 0:
+            raise GraphQLError("`first` on `crmStats` cannot be negative.")
+        return crm_stats(group_by=group_by.value if group_by else None, limit=min(first, 1000))
+
+    @cached_resolver(Customer, Product)
+    def resolve_search(self, info, query, first=20, kinds=None):
+        hits = search(query, kinds=[kind.value for kind in kinds or []], limit=max(1, min(first, 100)))
+        loaders = get_loaders(info)
+        for model in (Customer, Product):
+            loaders.track([instance for _, instance in hits if isinstance(instance, model)])
+        return [{'score': score, 'node': instance} for score, instance in hits]
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
 
-class Query(graphene.ObjectType):
-    hello = graphene.String(default_value="Hello, GraphQL!")
-    customers = graphene.List(CustomerType)
-    orders = graphene.List(OrderType)
-
-    def resolve_customers(self, info):
-        return Customer.objects.all()
-
-    def resolve_orders(self, info):
-        return Order.objects.all()
@@ -0,0 +1,205 @@
+"""
+Substring search over product names and customer names and emails.
+
+On SQLite every searchable model has an FTS5 table with the trigram
+tokenizer (``crm_product_fts``, ``crm_customer_fts``). It reads its text
+from the model's own table (``content=``) and triggers on that table keep
+it in step, so ``bulk_create``, ``update()`` and raw SQL are indexed along
+with ``save()``. The trigram index answers both ``LIKE '%x%'`` (``contains``,
+behind the name and email filters) and ``MATCH`` ranked by bm25
+(``search``). On PostgreSQL ``install`` adds pg_trgm GIN indexes on
+``UPPER(column)``, which is what Django's ``icontains`` compares, and
+results rank by trigram similarity. Other backends fall back to unranked
+``icontains``.
+
+``install`` runs from migration 0009 and again after every ``migrate``:
+SQLite drops a table's triggers when a migration rebuilds the table, and
+this puts them back (re-reading the index if any were missing).
+"""
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import OperationalError, connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Customer, Product
+
+# kind -> (model, {field: bm25 weight}); a hit in a customer's name outranks one in the email
+SEARCHABLE = {
+    'customer': (Customer, {'name': 2.0, 'email': 1.0}),
+    'product': (Product, {'name': 1.0}),
+}
+
+# The trigram tokenizer cannot MATCH anything shorter.
+MIN_TERM = 3
+# LIKE ... ESCAPE is never served by the trigram index.
+LIKE_SPECIAL = re.compile(r'[%_\\]')
+
+
+def fts_table(model):
+    return f"{model._meta.db_table}_fts"
+
+
+def _columns(model, fields):
+    return [model._meta.get_field(name).column for name in fields]
+
+
+def _sqlite_triggers(model, fields):
+    table, fts, pk = model._meta.db_table, fts_table(model), model._meta.pk.column
+    columns = _columns(model, fields)
+    names = ", ".join(columns)
+    insert = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.{pk}, {', '.join(f'new.{c}' for c in columns)});"
+    delete = (
+        f"INSERT INTO {fts}({fts}, rowid, {names}) "
+        f"VALUES ('delete', old.{pk}, {', '.join(f'old.{c}' for c in columns)});"
+    )
+    return {
+        f"{fts}_insert": f"AFTER INSERT ON {table} BEGIN {insert} END",
+        f"{fts}_delete": f"AFTER DELETE ON {table} BEGIN {delete} END",
+        f"{fts}_update": f"AFTER UPDATE OF {names} ON {table} BEGIN {delete} {insert} END",
+    }
+
+
+def _postgresql_indexes(model, fields):
+    table = model._meta.db_table
+    return {
+        f"{table}_{column}_trgm": f"ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)"
+        for column in _columns(model, fields)
+    }
+
+
+def install(connection=connection):
+    """Create whatever search tables, triggers and indexes are missing on ``connection``."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+            existing = {name for (name,) in cursor.fetchall()}
+            for model, weights in SEARCHABLE.values():
+                fts = fts_table(model)
+                if fts not in existing:
+                    try:
+                        cursor.execute(
+                            f"CREATE VIRTUAL TABLE {fts} USING fts5({', '.join(_columns(model, weights))}, "
+                            f"content='{model._meta.db_table}', content_rowid='{model._meta.pk.column}', "
+                            f"tokenize='trigram')"
+                        )
+                    except OperationalError:
+                        # No FTS5 or no trigram tokenizer (SQLite < 3.34): stay on icontains.
+                        continue
+                triggers = _sqlite_triggers(model, weights)
+                missing = [name for name in triggers if name not in existing]
+                for name in missing:
+                    cursor.execute(f"CREATE TRIGGER {name} {triggers[name]}")
+                if missing:
+                    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        connection._crm_search_tables = None
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for model, weights in SEARCHABLE.values():
+                for name, definition in _postgresql_indexes(model, weights).items():
+                    cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+
+
+def uninstall(connection=connection):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for model, weights in SEARCHABLE.values():
+                for name in _sqlite_triggers(model, weights):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(f"DROP TABLE IF EXISTS {fts_table(model)}")
+        connection._crm_search_tables = None
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for model, weights in SEARCHABLE.values():
+                for name in _postgresql_indexes(model, weights):
+                    cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def indexed(model):
+    """Whether ``model`` has an FTS5 table on the default connection."""
+    if connection.vendor != 'sqlite':
+        return False
+    tables = getattr(connection, '_crm_search_tables', None)
+    if tables is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            tables = connection._crm_search_tables = {name for (name,) in cursor.fetchall()}
+    return fts_table(model) in tables
+
+
+def contains(queryset, field, value):
+    """``queryset.filter(<field>__icontains=value)``, answered from the trigram index where there is one."""
+    model = queryset.model
+    # Under MIN_TERM characters the trigram index would read every row anyway.
+    if len(value) < MIN_TERM or LIKE_SPECIAL.search(value) or not indexed(model):
+        return queryset.filter(**{f'{field}__icontains': value})
+    (column,) = _columns(model, [field])
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT rowid FROM {fts_table(model)} WHERE {column} LIKE %s", (f'%{value}%',),
+    ))
+
+
+def _like(value):
+    return '%' + LIKE_SPECIAL.sub(lambda m: '\\' + m.group(), value) + '%'
+
+
+def _ranked_fts(model, weights, terms, limit):
+    fts = fts_table(model)
+    columns = _columns(model, weights)
+    long_terms = [term for term in terms if len(term) >= MIN_TERM]
+    # Each term a quoted phrase: FTS5 syntax in the query is matched literally.
+    where = [f"{fts} MATCH %s"]
+    params = [" ".join('"%s"' % term.replace('"', '""') for term in long_terms)]
+    score = f"-bm25({fts}, {', '.join(str(weight) for weight in weights.values())})"
+    for term in terms:
+        if len(term) < MIN_TERM:
+            where.append("(%s)" % " OR ".join(f"{column} LIKE %s ESCAPE '\\'" for column in columns))
+            params.extend([_like(term)] * len(columns))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, {score} AS score FROM {fts} WHERE {' AND '.join(where)} "
+            f"ORDER BY score DESC, rowid LIMIT %s",
+            [*params, limit],
+        )
+        return cursor.fetchall()
+
+
+def _ranked_orm(model, weights, terms, limit):
+    queryset = model.objects.filter(*[
+        reduce(or_, (Q(**{f'{field}__icontains': term}) for field in weights)) for term in terms
+    ])
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        from django.db.models.functions import Greatest
+
+        query = " ".join(terms)
+        similarities = [TrigramSimilarity(field, query) * weight for field, weight in weights.items()]
+        score = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        queryset = queryset.annotate(score=score).order_by('-score', 'pk')
+    else:
+        # Unranked: walk the primary key and stop at `limit` matches.
+        queryset = queryset.annotate(score=Value(0.0, output_field=FloatField())).order_by('pk')
+    return list(queryset.values_list('pk', 'score')[:limit])
+
+
+def search(query, kinds=None, limit=20):
+    """The best ``limit`` matches for ``query`` as ``(score, instance)`` pairs, highest score first.
+
+    Every whitespace-separated term must occur, case-insensitively, in one
+    of the row's searchable fields. ``kinds`` narrows ``SEARCHABLE``.
+    """
+    terms = query.split()
+    if not terms:
+        return []
+    hits = []
+    for kind in kinds or SEARCHABLE:
+        model, weights = SEARCHABLE[kind]
+        rank = _ranked_fts if indexed(model) and max(map(len, terms)) >= MIN_TERM else _ranked_orm
+        ranked = rank(model, weights, terms, limit)
+        objects = model.objects.in_bulk([pk for pk, _ in ranked])
+        hits.extend((score, objects[pk]) for pk, score in ranked if pk in objects)
+    hits.sort(key=lambda hit: -hit[0])
+    return hits[:limit]
@@ -3,6 +3,7 @@ Django settings for alx_backend_graphql_crm project.
 Generated by 'django-admin startproject' using Django 5.2.3.
 """
 
+import os
 from pathlib import Path
 from celery.schedules import crontab
 
@@ -97,9 +98,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # ✅ Graphene Schema Path
 GRAPHENE = {
-    "SCHEMA": "crm.schema.schema"
+    "SCHEMA": "crm.schema.schema",
+    "MIDDLEWARE": ["crm.tracing.TracingMiddleware"],
 }
 
+# ✅ Samples kept per field for the p50/p95/p99 at /graphql/field-stats
+CRM_TRACING_WINDOW = 1000
+
+# ✅ Parsed/validated GraphQL documents kept in the per-process LRU
+CRM_DOCUMENT_CACHE_SIZE = 500
+
+# ✅ Resolver result cache: 'locmem' (per-process LRU), 'django' (shared
+# Django cache alias) or None to disable. 'locmem' invalidates only within
+# its own process; with several workers use 'django' on a shared cache
+# (Redis/Memcached) or writes in one worker leave others serving stale results.
+CRM_RESOLVER_CACHE = {
+    'BACKEND': 'locmem',
+    'TIMEOUT': 300,
+    'MAX_ENTRIES': 1000,
+}
+
+# ✅ Query cost limits for the /graphql endpoint (see crm/cost.py)
+CRM_QUERY_COST = {
+    'MAX_COST': 5000,
+    'MAX_DEPTH': 10,
+    'DEFAULT_LIST_SIZE': 10,
+}
+
+# ✅ Cron/Celery GraphQL execution: "inprocess" runs documents against the
+# schema directly, "http" sends them to CRM_GRAPHQL_URL
+CRM_GRAPHQL_TRANSPORT = 'inprocess'
+CRM_GRAPHQL_URL = 'http://localhost:8000/graphql'
+
 # ✅ Django-Crontab Jobs
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
@@ -107,11 +137,20 @@ CRONJOBS = [
     ('0 */12 * * *', 'crm.cron.update_low_stock'),
 ]
 
-# ✅ Celery Configuration
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
+# ✅ Celery Configuration ('memory://' runs on the in-process broker)
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# ✅ Order reminder outbox (crm/reminders.py): orders from the last DAYS
+# days are queued CHUNK_SIZE at a time and sent BATCH_SIZE per Celery task
+CRM_REMINDERS = {
+    'DAYS': 7,
+    'CHUNK_SIZE': 2000,
+    'BATCH_SIZE': 500,
+    'LOG_FILE': '/tmp/order_reminders_log.txt',
+}
+
 # ✅ Celery Beat Scheduler
 CELERY_BEAT_SCHEDULE = {
     'generate-crm-report': {
@@ -0,0 +1,114 @@
+"""
+Model signal handlers.
+
+Incremental maintenance of ``Order.total_amount``:
+
+Changes to ``Order.products`` (from either side of the relation) adjust the
+stored total by the price delta of the products added or removed, applied
+as ``total_amount = total_amount + delta`` so concurrent changes compose.
+The full product set is never reloaded; ``manage.py recompute_order_totals``
+rebuilds totals from scratch for backfills.
+
+Per-customer summaries (``CustomerStats``, see crm/customer_stats.py) follow
+every order create, total change, edit and delete.
+
+Resolver cache invalidation: any write to a CRM model bumps its cache
+generation (see crm/caching.py).
+"""
+from decimal import Decimal
+
+from django.db.models import F, Sum
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import customer_stats
+from .caching import invalidate
+from .models import Customer, Order, Product
+
+OrderProducts = Order.products.through
+TOTAL_PLACES = Decimal(1).scaleb(-Order._meta.get_field('total_amount').decimal_places)
+
+
+def _adjust_totals(order_ids, delta):
+    if order_ids and delta:
+        Order.objects.filter(pk__in=order_ids).update(total_amount=F('total_amount') + delta)
+
+
+def _price_sum(queryset):
+    return queryset.aggregate(total=Sum('price'))['total'] or Decimal('0')
+
+
+@receiver(m2m_changed, sender=OrderProducts)
+def maintain_order_total(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # instance is an Order, pk_set holds product ids.
+        if action == 'post_add':
+            delta = _price_sum(Product.objects.filter(pk__in=pk_set))
+        elif action in ('pre_remove', 'pre_clear'):
+            # Only links that exist are removed; price them before they go.
+            linked = Product.objects.filter(order=instance)
+            if action == 'pre_remove':
+                linked = linked.filter(pk__in=pk_set)
+            instance._removed_total = _price_sum(linked)
+            return
+        elif action in ('post_remove', 'post_clear'):
+            delta = -instance.__dict__.pop('_removed_total', Decimal('0'))
+        else:
+            return
+        _adjust_totals([instance.pk], delta)
+        customer_stats.add_spent({instance.customer_id: 1}, delta)
+        # Rounded like the stored column, so the payload reads the same as a fresh load.
+        instance.total_amount = (Decimal(instance.total_amount or 0) + delta).quantize(TOTAL_PLACES)
+    else:
+        # instance is a Product, pk_set holds order ids.
+        if action == 'post_add':
+            _adjust_totals(pk_set, instance.price)
+            customer_stats.add_spent(customer_stats.orders_per_customer(pk_set), instance.price)
+        elif action in ('pre_remove', 'pre_clear'):
+            linked = OrderProducts.objects.filter(product_id=instance.pk)
+            if action == 'pre_remove':
+                linked = linked.filter(order_id__in=pk_set)
+            instance._removed_order_ids = list(linked.values_list('order_id', flat=True))
+        elif action in ('post_remove', 'post_clear'):
+            order_ids = instance.__dict__.pop('_removed_order_ids', [])
+            _adjust_totals(order_ids, -instance.price)
+            customer_stats.add_spent(customer_stats.orders_per_customer(order_ids), -instance.price)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_customer(sender, instance, update_fields=None, **kwargs):
+    # An existing order may be moving to another customer; both need refreshing.
+    if not instance._state.adding and (update_fields is None or 'customer' in update_fields):
+        instance._previous_customer_id = (
+            Order.objects.filter(pk=instance.pk).values_list('customer_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Order)
+def maintain_customer_stats(sender, instance, created, **kwargs):
+    if created:
+        customer_stats.record_order(instance)
+    else:
+        previous = instance.__dict__.pop('_previous_customer_id', None)
+        customer_stats.refresh({instance.customer_id, previous} - {None})
+
+
+@receiver(post_delete, sender=Order)
+def forget_order(sender, instance, **kwargs):
+    customer_stats.refresh([instance.customer_id])
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+def invalidate_cached_resolvers(sender, **kwargs):
+    invalidate(sender)
+
+
+@receiver(m2m_changed, sender=OrderProducts)
+def invalidate_cached_order_products(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate(Order, Product)
@@ -0,0 +1,81 @@
+"""
+Set-based stock maintenance.
+
+Stock is only ever changed with ``stock = stock + n`` style UPDATEs so the
+database applies each change atomically against the current row value; a
+concurrent order decrementing stock can never be overwritten by a restock
+that read an older value.
+
+Orders take their products out of stock with ``reserve_stock``: a
+conditional ``stock = stock - n WHERE stock >= n`` UPDATE, so the check and
+the decrement are one statement and two orders can never both take the
+last unit.
+"""
+from django.db import connection, transaction
+from django.db.models import Case, Exists, F, Value, When
+
+from .caching import invalidate
+from .models import Product
+
+
+class InsufficientStock(Exception):
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f"Insufficient stock for {', '.join(p.name for p in products)}.")
+
+
+def reserve_stock(quantities):
+    """Take ``quantities`` (``{product_id: n}``) out of stock, all or nothing.
+
+    One UPDATE for every product and quantity, with no rows read or locked
+    beforehand. If any product is short, nothing is taken and
+    ``InsufficientStock`` names the short products. Call it inside the
+    transaction that creates the order so a failed order gives the stock
+    back.
+    """
+    if not quantities:
+        return
+    if len(set(quantities.values())) == 1:
+        quantity = Value(next(iter(quantities.values())))
+    else:
+        quantity = Case(*[When(pk=pk, then=Value(n)) for pk, n in quantities.items()])
+    short = Product.objects.filter(pk__in=quantities, stock__lt=quantity)
+    with transaction.atomic(savepoint=False):
+        # The NOT EXISTS keeps a short product from letting the others through.
+        updated = (
+            Product.objects.filter(pk__in=quantities, stock__gte=quantity).exclude(Exists(short))
+            .update(stock=F('stock') - quantity)
+        )
+        if updated < len(quantities):
+            raise InsufficientStock(list(short.order_by('pk')))
+    invalidate(Product)
+
+
+def supports_update_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+
+
+def restock_low_stock(threshold=10, increment=10):
+    """Add ``increment`` to every product below ``threshold``; return the updated rows."""
+    if supports_update_returning():
+        table = connection.ops.quote_name(Product._meta.db_table)
+        stock = connection.ops.quote_name(Product._meta.get_field('stock').column)
+        columns = ", ".join(connection.ops.quote_name(f.column) for f in Product._meta.concrete_fields)
+        sql = f"UPDATE {table} SET {stock} = {stock} + %s WHERE {stock} < %s RETURNING {columns}"
+        with transaction.atomic():
+            products = list(Product.objects.raw(sql, [increment, threshold]))
+        invalidate(Product)
+        return sorted(products, key=lambda p: p.pk)
+
+    with transaction.atomic():
+        ids = list(
+            Product.objects.select_for_update()
+            .filter(stock__lt=threshold)
+            .values_list('pk', flat=True)
+        )
+        Product.objects.filter(pk__in=ids).update(stock=F('stock') + increment)
+        products = list(Product.objects.filter(pk__in=ids).order_by('pk'))
+    invalidate(Product)
+    return products
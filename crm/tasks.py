@@ -1,7 +1,7 @@
 from celery import shared_task
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
 from datetime import datetime
+from crm.executor import get_executor
+from crm import reminders
 
 @shared_task
 def generate_crm_report():
@@ -9,24 +9,19 @@ def generate_crm_report():
     log_file = "/tmp/crm_report_log.txt"
 
     try:
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            verify=True,
-            retries=3,
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=False)
-
-        query = gql("""
+        client = get_executor()
+
+        # Counts and revenue are aggregated in the database by crmStats
+        query = """
         {
-          customers { id }
-          orders { id totalAmount }
+          crmStats { customerCount orderCount revenue }
         }
-        """)
+        """
 
         response = client.execute(query)
-        total_customers = len(response["customers"])
-        total_orders = len(response["orders"])
-        total_revenue = sum(order["totalAmount"] for order in response["orders"])
+        total_customers = response["crmStats"]["customerCount"]
+        total_orders = response["crmStats"]["orderCount"]
+        total_revenue = float(response["crmStats"]["revenue"])
 
         report = f"{timestamp} - Report: {total_customers} customers, {total_orders} orders, R{total_revenue:.2f}\n"
 
@@ -36,3 +31,14 @@ def generate_crm_report():
         print("CRM report generated.")
     except Exception as e:
         print("Failed to generate CRM report:", str(e))
+
+
+@shared_task
+def send_order_reminders(reminder_ids):
+    return reminders.send_reminders(reminder_ids)
+
+
+@shared_task
+def queue_order_reminders():
+    queued, tasks = reminders.queue_order_reminders()
+    return {'queued': queued, 'tasks': tasks}
@@ -1,3 +1,1484 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphql import parse, validate
+
+from .benchmarks import OPERATIONS, Runner, compare
+from .caching import DjangoCacheBackend, LocalLRUBackend, ResolverCache, resolver_cache
+from .cost import query_cost
+from . import customer_stats
+from .documents import DocumentCache, document_cache, query_hash
+from .factories import create_dataset
+from .executor import GraphQLExecutionError, HTTPExecutor, InProcessExecutor, get_executor
+from .filters import CustomerFilter
+from .imports import import_csv
+from .loaders import AsyncDataLoader, Loaders
+from .models import Customer, CustomerStats, Product, Order, OrderReminder
+from .reminders import enqueue_reminders, pending_batches, queue_order_reminders
+from .schema import schema
+from . import search
+from .stock import restock_low_stock
+from .celery import app as celery_app
+from .tasks import generate_crm_report
+from .tracing import field_stats
+from .validators import validate_phone
+from .views import AsyncCRMGraphQLView, CRMGraphQLView, export_view, field_stats_view
+
+
+def execute(query, **variables):
+    request = RequestFactory().post('/graphql')
+    return schema.execute(query, variable_values=variables, context_value=request)
+
+
+def nodes(data, field):
+    return [edge['node'] for edge in data[field]['edges']]
+
+
+class CRMTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        products = [Product.objects.create(name=f"Product {i}", price=Decimal("10.00"), stock=5) for i in range(5)]
+        for i in range(10):
+            customer = Customer.objects.create(name=f"Customer {i}", email=f"customer{i}@example.com")
+            for j in range(2):
+                order = Order.objects.create(customer=customer)
+                order.products.set(products[j:j + 2])
+
+    def setUp(self):
+        # Test rollbacks send no signals, so cached results would leak.
+        resolver_cache.clear()
+
+    def assertQueryCount(self, query, expected):
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(query)
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(ctx.captured_queries), expected, [q['sql'] for q in ctx.captured_queries])
+        return result.data
+
+
+class QueryPlanningTests(CRMTestCase):
+    def test_orders_with_customer_and_products(self):
+        data = self.assertQueryCount("{ orders { edges { node { id customer { email } products { name } } } } }", 2)
+        self.assertEqual(len(nodes(data, 'orders')), 20)
+        self.assertEqual(len(nodes(data, 'orders')[0]['products']), 2)
+
+    def test_customers_with_nested_orders(self):
+        data = self.assertQueryCount(
+            "{ customers { edges { node { email orderSet { id customer { name } products { name } } } } } }", 3
+        )
+        self.assertEqual(len(nodes(data, 'customers')[0]['orderSet']), 2)
+
+    def test_products_with_nested_orders(self):
+        data = self.assertQueryCount("{ products { edges { node { name orderSet { id customer { email } } } } } }", 2)
+        self.assertEqual(len(nodes(data, 'products')[1]['orderSet']), 20)
+
+    def test_scalar_selection_reads_only_selected_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            execute("{ orders { edges { node { id totalAmount } } } }")
+        sql = ctx.captured_queries[0]['sql']
+        self.assertIn('"total_amount"', sql)
+        self.assertNotIn('"crm_order"."customer_id"', sql)
+
+    def test_foreign_key_selection_is_a_single_join(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute("{ orders { edges { node { customer { email } } } } }")
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('JOIN', ctx.captured_queries[0]['sql'])
+        self.assertNotIn('"name"', ctx.captured_queries[0]['sql'])
+
+    def test_fragments_are_planned(self):
+        query = """
+        query { orders { edges { node { ...OrderFields ... on OrderType { products { name } } } } } }
+        fragment OrderFields on OrderType { id customer { email } }
+        """
+        data = self.assertQueryCount(query, 2)
+        self.assertEqual(nodes(data, 'orders')[0]['customer']['email'], 'customer0@example.com')
+
+
+class KeysetPaginationTests(CRMTestCase):
+    PAGE = """
+    query($first: Int, $after: String, $last: Int, $before: String) {
+      orders(first: $first, after: $after, last: $last, before: $before) {
+        edges { cursor node { id } }
+        pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+      }
+    }
+    """
+
+    def test_forward_pages_cover_every_order_once(self):
+        seen, after = [], None
+        while True:
+            result = execute(self.PAGE, first=6, after=after)
+            self.assertIsNone(result.errors)
+            seen += [node['id'] for node in nodes(result.data, 'orders')]
+            page_info = result.data['orders']['pageInfo']
+            if not page_info['hasNextPage']:
+                break
+            after = page_info['endCursor']
+        expected = Order.objects.order_by('order_date', 'id').values_list('id', flat=True)
+        self.assertEqual(seen, [str(pk) for pk in expected])
+
+    def test_backward_page(self):
+        result = execute(self.PAGE, last=3)
+        self.assertIsNone(result.errors)
+        expected = list(Order.objects.order_by('order_date', 'id').values_list('id', flat=True))[-3:]
+        self.assertEqual([node['id'] for node in nodes(result.data, 'orders')], [str(pk) for pk in expected])
+        self.assertTrue(result.data['orders']['pageInfo']['hasPreviousPage'])
+
+        before = result.data['orders']['pageInfo']['startCursor']
+        result = execute(self.PAGE, last=2, before=before)
+        expected = list(Order.objects.order_by('order_date', 'id').values_list('id', flat=True))[-5:-3]
+        self.assertEqual([node['id'] for node in nodes(result.data, 'orders')], [str(pk) for pk in expected])
+
+    def test_later_pages_seek_instead_of_offset(self):
+        first_page = execute(self.PAGE, first=10)
+        with CaptureQueriesContext(connection) as ctx:
+            execute(self.PAGE, first=10, after=first_page.data['orders']['pageInfo']['endCursor'])
+        self.assertEqual(len(ctx.captured_queries), 1, [q['sql'] for q in ctx.captured_queries])
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('OFFSET', sql)
+        self.assertIn('LIMIT 11', sql)
+
+    def test_page_size_is_capped(self):
+        result = execute(self.PAGE, first=10_000)
+        self.assertIn('must be between 0 and', result.errors[0].message)
+
+    def test_invalid_cursor(self):
+        result = execute(self.PAGE, first=5, after='not-a-cursor')
+        self.assertIn('Invalid cursor', result.errors[0].message)
+
+
+class FilterIndexTests(CRMTestCase):
+    # (connection arguments as the API receives them, table, filtered column)
+    FILTERS = [
+        ('orders(orderDate_Gte: "2024-01-01")', 'crm_order', 'order_date'),
+        ('orders(totalAmount_Gte: 15)', 'crm_order', 'total_amount'),
+        ('customers(phonePattern: "+27")', 'crm_customer', 'phone'),
+    ]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return "\n".join(row[-1] for row in cursor.fetchall())
+
+    def page_plan(self, field, after=None):
+        """EXPLAIN QUERY PLAN of the page query the connection runs, keyset ORDER BY and LIMIT included."""
+        name, args = field.split('(', 1)
+        if after:
+            args = f'after: "{after}", {args}'
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(f"{{ {name}(first: 5, {args} {{ pageInfo {{ endCursor }} edges {{ node {{ id }} }} }} }}")
+        self.assertIsNone(result.errors)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertIn("ORDER BY", sql)
+        self.assertIn("LIMIT 6", sql)
+        return self.explain(sql), result.data[name]['pageInfo']['endCursor']
+
+    def test_filters_are_index_backed(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("EXPLAIN QUERY PLAN output is SQLite specific")
+        Order.objects.update(order_date=timezone.now())
+        Customer.objects.update(phone="+27 82 555 0100")
+        for field, table, column in self.FILTERS:
+            with self.subTest(field):
+                plan, cursor = self.page_plan(field)
+                self.assertIsNotNone(cursor)
+                # The first page searches the filtered column's index.
+                self.assertRegex(plan, rf"SEARCH {table} USING (COVERING )?INDEX \w+ \({column}[<>=]")
+                # A later page may instead seek the ordering index to the cursor,
+                # but never walks the primary key or the whole table.
+                self.assertRegex(self.page_plan(field, cursor)[0], rf"SEARCH {table} USING (COVERING )?INDEX \w+ \(")
+
+    def test_low_stock_update_is_index_backed(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("EXPLAIN QUERY PLAN output is SQLite specific")
+        with CaptureQueriesContext(connection) as ctx:
+            restock_low_stock(threshold=3, increment=1)
+        (sql,) = [query['sql'] for query in ctx.captured_queries if '"stock" <' in query['sql']]
+        self.assertRegex(self.explain(sql), r"SEARCH crm_product USING (COVERING )?INDEX crm_product_stock_idx \(stock<")
+
+    def test_reminder_filter_is_served(self):
+        result = execute('{ orders(orderDate_Gte: "2000-01-01", first: 5) { edges { node { id customer { email } } } } }')
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(result.data['orders']['edges']), 5)
+
+
+class DataLoaderTests(CRMTestCase):
+    def test_tracked_orders_load_relations_in_one_query_each(self):
+        orders = list(Order.objects.all())
+        loaders = Loaders()
+        loaders.track(orders)
+        with CaptureQueriesContext(connection) as ctx:
+            customers = [loaders.customer_by_id.load(o.customer_id) for o in orders]
+            products = [loaders.products_by_order_id.load(o.pk) for o in orders]
+            reverse = [loaders.orders_by_product_id.load(p.pk) for p in products[0]]
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertEqual(customers[0].pk, orders[0].customer_id)
+        self.assertEqual(len(products[0]), 2)
+        self.assertEqual(len(reverse[1]), 20)
+
+    def test_mutation_payload_relations_use_loaders(self):
+        customer = Customer.objects.first()
+        product_ids = list(Product.objects.values_list('id', flat=True)[:3])
+        result = execute("""
+        mutation($customerId: ID!, $productIds: [ID]!) {
+          createOrder(customerId: $customerId, productIds: $productIds) {
+            order { customer { email } products { name } }
+          }
+        }
+        """, customerId=customer.pk, productIds=product_ids)
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(result.data['createOrder']['order']['products']), 3)
+
+
+class BulkCreateCustomersTests(TestCase):
+    MUTATION = """
+    mutation($input: [CustomerInput]!) {
+      bulkCreateCustomers(input: $input) { customers { id email } errors }
+    }
+    """
+
+    def test_bulk_create_reports_errors_per_record(self):
+        Customer.objects.create(name="Existing", email="taken@example.com")
+        records = [
+            {"name": "A", "email": "a@example.com", "phone": "123-456-7890"},
+            {"name": "B", "email": "not-an-email"},
+            {"name": "C", "email": "taken@example.com"},
+            {"name": "D", "email": "a@example.com"},
+            {"name": "E", "email": "e@example.com", "phone": "12"},
+            {"name": "F", "email": "f@example.com"},
+        ]
+        result = execute(self.MUTATION, input=records)
+        self.assertIsNone(result.errors)
+        payload = result.data['bulkCreateCustomers']
+        self.assertEqual([c['email'] for c in payload['customers']], ["a@example.com", "f@example.com"])
+        self.assertTrue(all(c['id'] for c in payload['customers']))
+        self.assertEqual(payload['errors'], [
+            "Record 2: ['Enter a valid email address.']",
+            "Record 3: Email already exists",
+            "Record 4: Email already exists",
+            "Record 5: Invalid phone format",
+        ])
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        records = [{"name": f"C{i}", "email": f"c{i}@example.com"} for i in range(400)]
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(self.MUTATION, input=records)
+        self.assertIsNone(result.errors)
+        self.assertEqual(Customer.objects.count(), 400)
+        self.assertLess(len(ctx.captured_queries), 10)
+
+
+class UpdateLowStockProductsTests(TestCase):
+    MUTATION = """
+    mutation($threshold: Int, $increment: Int) {
+      updateLowStockProducts(threshold: $threshold, increment: $increment) {
+        products { name stock } updatedProducts success message
+      }
+    }
+    """
+
+    def setUp(self):
+        for name, stock in [("Low", 2), ("Edge", 9), ("Full", 10), ("Plenty", 50)]:
+            Product.objects.create(name=name, price=Decimal("1.00"), stock=stock)
+
+    def test_defaults_restock_below_ten(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(self.MUTATION)
+        self.assertIsNone(result.errors)
+        payload = result.data['updateLowStockProducts']
+        self.assertEqual(payload['updatedProducts'], ["Low (12)", "Edge (19)"])
+        self.assertEqual(payload['success'], "Stock updated successfully")
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+    def test_custom_threshold_and_increment(self):
+        result = execute(self.MUTATION, threshold=20, increment=5)
+        payload = result.data['updateLowStockProducts']
+        self.assertEqual(payload['products'], [
+            {'name': "Low", 'stock': 7}, {'name': "Edge", 'stock': 14}, {'name': "Full", 'stock': 15},
+        ])
+        self.assertEqual(Product.objects.get(name="Plenty").stock, 50)
+
+    def test_fallback_without_returning(self):
+        with mock.patch('crm.stock.supports_update_returning', return_value=False):
+            result = execute(self.MUTATION)
+        self.assertEqual(result.data['updateLowStockProducts']['updatedProducts'], ["Low (12)", "Edge (19)"])
+
+    def test_increment_must_be_positive(self):
+        result = execute(self.MUTATION, increment=0)
+        self.assertEqual(result.data['updateLowStockProducts']['message'], "Increment must be positive.")
+        self.assertEqual(Product.objects.get(name="Low").stock, 2)
+
+
+class BulkCreateOrdersTests(TestCase):
+    MUTATION = """
+    mutation($input: [OrderInput]!) {
+      bulkCreateOrders(input: $input) {
+        orders { id totalAmount customer { email } products { name } }
+        errors
+      }
+    }
+    """
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        self.products = [Product.objects.create(name=f"P{i}", price=Decimal(f"{i}.50"), stock=10) for i in range(1, 4)]
+
+    def test_creates_orders_and_reports_errors(self):
+        ids = [p.pk for p in self.products]
+        records = [
+            {"customerId": self.customer.pk, "productIds": ids[:2]},
+            {"customerId": 999999, "productIds": ids},
+            {"customerId": self.customer.pk, "productIds": []},
+            {"customerId": self.customer.pk, "productIds": [ids[0], 999999]},
+            {"customerId": self.customer.pk, "productIds": ids, "orderDate": "2024-03-01T10:00:00+00:00"},
+        ]
+        result = execute(self.MUTATION, input=records)
+        self.assertIsNone(result.errors)
+        payload = result.data['bulkCreateOrders']
+        self.assertEqual(payload['errors'], [
+            "Record 2: Invalid customer ID.",
+            "Record 3: At least one product must be selected.",
+            "Record 4: One or more invalid product IDs.",
+        ])
+        self.assertEqual([o['totalAmount'] for o in payload['orders']], ["4.00", "7.50"])
+        self.assertEqual([p['name'] for p in payload['orders'][1]['products']], ["P1", "P2", "P3"])
+        order = Order.objects.get(pk=payload['orders'][1]['id'])
+        self.assertEqual(order.order_date.year, 2024)
+        self.assertEqual(order.products.count(), 3)
+
+    def test_refuses_orders_beyond_stock(self):
+        scarce, plenty = self.products[0], self.products[1]
+        Product.objects.filter(pk=scarce.pk).update(stock=2)
+        records = [{"customerId": self.customer.pk, "productIds": [scarce.pk, plenty.pk]} for _ in range(3)]
+        records.append({"customerId": self.customer.pk, "productIds": [plenty.pk]})
+        result = execute(self.MUTATION, input=records)
+        self.assertIsNone(result.errors)
+        payload = result.data['bulkCreateOrders']
+        self.assertEqual(payload['errors'], ["Record 3: Insufficient stock for P1."])
+        self.assertEqual(len(payload['orders']), 3)
+        self.assertEqual(Product.objects.get(pk=scarce.pk).stock, 0)
+        self.assertEqual(Product.objects.get(pk=plenty.pk).stock, 7)
+
+    def test_query_count_is_constant(self):
+        Product.objects.update(stock=200)
+        records = [{"customerId": self.customer.pk, "productIds": [p.pk for p in self.products]} for _ in range(200)]
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(self.MUTATION, input=records)
+        self.assertIsNone(result.errors)
+        self.assertEqual(Order.objects.count(), 200)
+        self.assertEqual(Order.products.through.objects.count(), 600)
+        self.assertLess(len(ctx.captured_queries), 12)
+
+
+class OrderTotalTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        self.a = Product.objects.create(name="A", price=Decimal("10.00"))
+        self.b = Product.objects.create(name="B", price=Decimal("2.50"))
+        self.c = Product.objects.create(name="C", price=Decimal("1.25"))
+        self.order = Order.objects.create(customer=self.customer)
+
+    def stored_total(self):
+        return Order.objects.get(pk=self.order.pk).total_amount
+
+    def test_total_follows_add_remove_set_and_clear(self):
+        self.order.products.add(self.a, self.b)
+        self.assertEqual(self.stored_total(), Decimal("12.50"))
+        self.order.products.add(self.a)
+        self.assertEqual(self.stored_total(), Decimal("12.50"))
+        self.order.products.remove(self.b, self.c)
+        self.assertEqual(self.stored_total(), Decimal("10.00"))
+        self.order.products.set([self.b, self.c])
+        self.assertEqual(self.stored_total(), Decimal("3.75"))
+        self.assertEqual(self.order.total_amount, Decimal("3.75"))
+        self.order.products.clear()
+        self.assertEqual(self.stored_total(), Decimal("0.00"))
+
+    def test_instance_total_keeps_the_column_scale(self):
+        self.order.products.add(self.a, self.b)
+        self.assertEqual(str(self.order.total_amount), "12.50")
+        product = Product.objects.create(name="Whole", price=Decimal("20"), stock=1)
+        result = execute(
+            "mutation($c: ID!, $p: [ID]!) { createOrder(customerId: $c, productIds: $p) { order { totalAmount } } }",
+            c=self.customer.pk, p=[product.pk],
+        )
+        self.assertEqual(result.data['createOrder']['order']['totalAmount'], "20.00")
+
+    def test_total_follows_reverse_side(self):
+        other = Order.objects.create(customer=self.customer)
+        self.a.order_set.add(self.order, other)
+        self.assertEqual(Order.objects.get(pk=other.pk).total_amount, Decimal("10.00"))
+        self.a.order_set.remove(other)
+        self.assertEqual(Order.objects.get(pk=other.pk).total_amount, Decimal("0.00"))
+        self.a.order_set.clear()
+        self.assertEqual(self.stored_total(), Decimal("0.00"))
+
+    def test_add_does_not_reload_existing_products(self):
+        self.order.products.add(self.a, self.b)
+        with CaptureQueriesContext(connection) as ctx:
+            self.order.products.add(self.c)
+        sql = " ".join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('INNER JOIN "crm_order_products"', sql)
+        self.assertEqual(self.stored_total(), Decimal("13.75"))
+
+    def test_recompute_command_repairs_drift(self):
+        self.order.products.add(self.a, self.b)
+        Order.objects.filter(pk=self.order.pk).update(total_amount=0)
+        empty = Order.objects.create(customer=self.customer, total_amount=Decimal("99.00"))
+        call_command('recompute_order_totals', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.stored_total(), Decimal("12.50"))
+        self.assertEqual(Order.objects.get(pk=empty.pk).total_amount, Decimal("0.00"))
+
+
+class CRMStatsTests(CRMTestCase):
+    QUERY = """
+    query($groupBy: StatsGrouping) {
+      crmStats(groupBy: $groupBy) {
+        customerCount orderCount revenue averageOrderValue
+        groups { key orderCount revenue averageOrderValue }
+      }
+    }
+    """
+
+    def test_totals_are_aggregated_in_the_database(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(self.QUERY)
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        stats = result.data['crmStats']
+        self.assertEqual(stats['customerCount'], 10)
+        self.assertEqual(stats['orderCount'], 20)
+        self.assertEqual(stats['revenue'], "400.00")
+        self.assertEqual(stats['averageOrderValue'], "20.00")
+        self.assertEqual(stats['groups'], [])
+
+    def test_grouped_by_customer_and_day(self):
+        order = Order.objects.first()
+        Order.objects.filter(pk=order.pk).update(total_amount=Decimal("100.00"))
+        # update() bypasses the signals that maintain CustomerStats
+        customer_stats.refresh([order.customer_id])
+        by_customer = execute(self.QUERY, groupBy='CUSTOMER').data['crmStats']['groups']
+        self.assertEqual(len(by_customer), 10)
+        self.assertEqual(by_customer[0]['revenue'], "120.00")
+        self.assertEqual(by_customer[0]['orderCount'], 2)
+
+        by_day = execute(self.QUERY, groupBy='DAY').data['crmStats']['groups']
+        self.assertEqual(sum(group['orderCount'] for group in by_day), 20)
+
+    def test_first_keeps_the_most_recent_periods(self):
+        now = timezone.now()
+        for days in (1, 3, 10):
+            Order.objects.filter(pk=Order.objects.order_by('pk')[days].pk).update(order_date=now - timedelta(days=days))
+        query = "query($n: Int) { crmStats(groupBy: DAY, first: $n) { groups { key } } }"
+        keys = [group['key'] for group in execute(query, n=2).data['crmStats']['groups']]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(keys[0][:10], timezone.localdate(now - timedelta(days=1)).isoformat())
+
+        result = execute(query, n=-1)
+        self.assertEqual(result.errors[0].message, "`first` on `crmStats` cannot be negative.")
+
+
+class InProcessExecutorTests(CRMTestCase):
+    def test_executes_against_schema_without_http(self):
+        executor = get_executor()
+        self.assertIsInstance(executor, InProcessExecutor)
+        self.assertEqual(executor.execute("{ hello }"), {'hello': "Hello, GraphQL!"})
+
+    def test_errors_are_raised(self):
+        with self.assertRaises(GraphQLExecutionError):
+            get_executor().execute("{ nope }")
+
+    @override_settings(CRM_GRAPHQL_TRANSPORT='http', CRM_GRAPHQL_URL='http://example.invalid/graphql')
+    def test_http_transport_is_still_available(self):
+        self.assertIsInstance(get_executor(), HTTPExecutor)
+
+    def test_report_task_runs_in_process(self):
+        with mock.patch('builtins.open', mock.mock_open()) as log, mock.patch('builtins.print'):
+            generate_crm_report()
+        report = log().write.call_args[0][0]
+        self.assertIn("Report: 10 customers, 20 orders, R400.00", report)
+
+
+class PersistedQueryTests(CRMTestCase):
+    QUERY = "{ crmStats { orderCount } }"
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        document_cache.clear()
+        self.view = CRMGraphQLView.as_view(schema=schema)
+
+    def post(self, body):
+        request = RequestFactory().post('/graphql', json.dumps(body), content_type='application/json')
+        response = self.view(request)
+        return json.loads(response.content)
+
+    def apq(self, sha256):
+        return {"persistedQuery": {"version": 1, "sha256Hash": sha256}}
+
+    def test_automatic_persisted_query_protocol(self):
+        sha256 = query_hash(self.QUERY)
+        missing = self.post({"extensions": self.apq(sha256)})
+        self.assertEqual(missing['errors'][0]['extensions']['code'], "PERSISTED_QUERY_NOT_FOUND")
+
+        registered = self.post({"query": self.QUERY, "extensions": self.apq(sha256)})
+        self.assertEqual(registered['data'], {'crmStats': {'orderCount': 20}})
+
+        by_hash = self.post({"extensions": self.apq(sha256)})
+        self.assertEqual(by_hash['data'], {'crmStats': {'orderCount': 20}})
+
+    def test_hash_must_match_query(self):
+        result = self.post({"query": self.QUERY, "extensions": self.apq("0" * 64)})
+        self.assertEqual(result['errors'][0]['extensions']['code'], "PERSISTED_QUERY_HASH_MISMATCH")
+
+    def test_malformed_extensions_are_rejected(self):
+        for extensions in ['"x"', ["persistedQuery"], {"persistedQuery": "x"}, {"persistedQuery": {"sha256Hash": 1}}]:
+            with self.subTest(extensions=extensions):
+                result = self.post({"query": self.QUERY, "extensions": extensions})
+                self.assertEqual(result['errors'][0]['extensions']['code'], "PERSISTED_QUERY_INVALID")
+        request = AsyncRequestFactory().post(
+            '/graphql', json.dumps({"extensions": {"persistedQuery": "x"}}), content_type='application/json',
+        )
+        response = async_to_sync(AsyncCRMGraphQLView.as_view(schema=schema))(request)
+        self.assertEqual(json.loads(response.content)['errors'][0]['extensions']['code'], "PERSISTED_QUERY_INVALID")
+
+    def test_repeated_documents_skip_parse_and_validate(self):
+        with mock.patch('crm.documents.parse', wraps=parse) as parse_spy, \
+                mock.patch('crm.documents.validate', wraps=validate) as validate_spy:
+            for _ in range(3):
+                self.assertEqual(self.post({"query": self.QUERY})['data'], {'crmStats': {'orderCount': 20}})
+        self.assertEqual(parse_spy.call_count, 1)
+        self.assertEqual(validate_spy.call_count, 1)
+        self.assertEqual(document_cache.stats()['hits'], 2)
+
+    def test_invalid_documents_are_not_cached(self):
+        result = self.post({"query": "{ nope }"})
+        self.assertIn('errors', result)
+        self.assertEqual(document_cache.stats()['size'], 0)
+
+    def test_cache_evicts_least_recently_used(self):
+        small = DocumentCache(maxsize=2)
+        small.set('a', 1)
+        small.set('b', 2)
+        small.get('a')
+        small.set('c', 3)
+        self.assertIsNone(small.get('b'))
+        self.assertEqual(small.get('a'), 1)
+        self.assertEqual(small.stats()['size'], 2)
+        self.assertEqual(small.stats()['evictions'], 1)
+
+
+class ResolverCacheTests(CRMTestCase):
+    ORDERS = "{ orders(first: 5) { edges { node { id totalAmount customer { email } products { name } } } } }"
+
+    def test_repeated_query_is_served_without_sql(self):
+        first = self.assertQueryCount(self.ORDERS, 2)
+        second = self.assertQueryCount(self.ORDERS, 0)
+        self.assertEqual(first, second)
+
+    def test_arguments_and_selection_are_part_of_the_key(self):
+        self.assertQueryCount(self.ORDERS, 2)
+        self.assertQueryCount(self.ORDERS.replace("first: 5", "first: 6"), 2)
+        self.assertQueryCount("{ orders(first: 5) { edges { node { id } } } }", 1)
+
+    def test_save_invalidates(self):
+        self.assertQueryCount("{ customers(first: 1) { edges { node { name } } } }", 1)
+        customer = Customer.objects.get(name="Customer 0")
+        customer.name = "Renamed"
+        customer.save()
+        data = self.assertQueryCount("{ customers(first: 1) { edges { node { name } } } }", 1)
+        self.assertEqual(nodes(data, 'customers')[0]['name'], "Renamed")
+
+    def test_m2m_changes_invalidate_orders_and_stats(self):
+        query = "{ crmStats { revenue } }"
+        self.assertEqual(execute(query).data['crmStats']['revenue'], "400.00")
+        order = Order.objects.first()
+        order.products.add(Product.objects.create(name="Extra", price=Decimal("5.00")))
+        self.assertEqual(execute(query).data['crmStats']['revenue'], "405.00")
+
+    def test_set_based_writes_invalidate(self):
+        query = "{ products(first: 1) { edges { node { stock } } } }"
+        self.assertEqual(nodes(execute(query).data, 'products')[0]['stock'], 5)
+        execute("mutation { updateLowStockProducts { updatedProducts } }")
+        self.assertEqual(nodes(execute(query).data, 'products')[0]['stock'], 15)
+
+    def test_django_cache_backend(self):
+        cache.clear()
+        shared = ResolverCache(DjangoCacheBackend())
+        with mock.patch('crm.pagination.resolver_cache', shared), mock.patch('crm.caching.resolver_cache', shared):
+            self.assertQueryCount(self.ORDERS, 2)
+            self.assertQueryCount(self.ORDERS, 0)
+            Order.objects.first().save()
+            self.assertQueryCount(self.ORDERS, 2)
+
+    def test_invalidation_is_repeated_on_commit(self):
+        local = ResolverCache(LocalLRUBackend())
+        with self.captureOnCommitCallbacks(execute=True):
+            local.invalidate(Customer)
+            self.assertEqual(local.backend.generation('crm.Customer'), 1)
+        self.assertEqual(local.backend.generation('crm.Customer'), 2)
+
+    @override_settings(CRM_RESOLVER_CACHE={'BACKEND': None})
+    def test_disabled(self):
+        disabled = ResolverCache.from_settings()
+        self.assertIsNone(disabled.backend)
+        self.assertEqual(disabled.get_or_set(None, {}, (Order,), lambda: 1), 1)
+
+
+class QueryCostTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.view = CRMGraphQLView.as_view(schema=schema)
+
+    def post(self, query, **variables):
+        body = {"query": query, "variables": variables}
+        request = RequestFactory().post('/graphql', json.dumps(body), content_type='application/json')
+        response = self.view(request)
+        return response.status_code, json.loads(response.content)
+
+    def cost(self, query, **variables):
+        return query_cost(schema, parse(query), variables=variables)
+
+    def test_page_sizes_and_lists_multiply(self):
+        self.assertEqual(self.cost("{ hello }"), (0, 0))
+        self.assertEqual(self.cost("{ orders(first: 5) { edges { node { id } } } }"), (1 + 5 * 2, 3))
+        self.assertEqual(
+            self.cost("{ orders(first: 5) { edges { node { products { name } } } } }"),
+            (1 + 5 * 3, 4),
+        )
+        self.assertEqual(self.cost("{ orders { edges { node { id } } } }"), (1 + 100 * 2, 3))
+        self.assertEqual(self.cost("{ orders(first: -5) { edges { node { id } } } }"), (1, 3))
+        self.assertEqual(self.cost("{ orders(last: 5000) { edges { node { id } } } }"), (1 + 100 * 2, 3))
+
+    def test_search_is_priced_by_its_first_argument(self):
+        query = 'query($n: Int) { search(query: "x", first: $n) { node { ... on CustomerType { orderSet { id } } } } }'
+        self.assertEqual(self.cost(query, n=3), (1 + 3 * (1 + 1), 3))
+        self.assertEqual(self.cost('{ search(query: "x") { score } }'), (1, 1))
+        self.assertEqual(self.cost('{ search(query: "x") { node { ... on ProductType { name } } } }'), (1 + 20, 2))
+
+    def test_variables_and_fragments_are_priced(self):
+        query = """
+        query($n: Int) { customers(first: $n) { edges { node { ...C } } } }
+        fragment C on CustomerType { orderSet { id } }
+        """
+        self.assertEqual(self.cost(query, n=3), (1 + 3 * 3, 4))
+
+    def test_cost_is_returned_in_extensions(self):
+        status, body = self.post("query($n: Int) { orders(first: $n) { edges { node { id } } } }", n=2)
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body['data']['orders']['edges']), 2)
+        self.assertEqual(body['extensions']['cost']['requestedQueryCost'], 5)
+        self.assertEqual(body['extensions']['cost']['maximumAvailable'], 5000)
+
+    def test_expensive_query_is_rejected_before_execution(self):
+        query = """
+        { products { edges { node { orderSet { products { orderSet { customer { name } } } } } } } }
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            status, body = self.post(query)
+        self.assertEqual(status, 400)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertNotIn('data', body)
+        self.assertEqual(body['errors'][0]['extensions']['code'], "QUERY_TOO_EXPENSIVE")
+        self.assertGreater(body['errors'][0]['extensions']['cost']['requestedQueryCost'], 5000)
+
+    @override_settings(CRM_QUERY_COST={'MAX_DEPTH': 3})
+    def test_depth_limit(self):
+        status, body = self.post("{ orders(first: 1) { edges { node { customer { name } } } } }")
+        self.assertEqual(status, 400)
+        self.assertIn("depth 4 exceeds the maximum of 3", body['errors'][0]['message'])
+
+
+class AsyncViewTests(CRMTestCase):
+    QUERY = "{ orders(first: 20) { edges { node { id customer { email } products { name } } } } }"
+
+    def post(self, query, **variables):
+        view = AsyncCRMGraphQLView.as_view(schema=schema)
+        body = json.dumps({"query": query, "variables": variables})
+        # Sync ORM work hops back to this thread, so queries land on the test connection.
+        response = async_to_sync(view)(AsyncRequestFactory().post('/graphql', body, content_type='application/json'))
+        return response.status_code, json.loads(response.content)
+
+    def test_query_matches_sync_view_with_same_query_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            status, body = self.post(self.QUERY)
+        self.assertEqual(status, 200)
+        self.assertNotIn('errors', body)
+        self.assertEqual(body['data'], execute(self.QUERY).data)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertIn('cost', body['extensions'])
+
+    def test_nested_lists_are_batched_by_async_loaders(self):
+        query = "{ products { edges { node { name orderSet { customer { email } products { name } } } } } }"
+        with CaptureQueriesContext(connection) as ctx:
+            status, body = self.post(query)
+        self.assertEqual(status, 200, body)
+        self.assertEqual(len(body['data']['products']['edges'][1]['node']['orderSet']), 20)
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+
+    def test_paging_and_stats(self):
+        query = "query($n: Int) { customers(first: $n) { pageInfo { hasNextPage } } crmStats { orderCount } }"
+        status, body = self.post(query, n=3)
+        self.assertEqual(body['data'], {'customers': {'pageInfo': {'hasNextPage': True}}, 'crmStats': {'orderCount': 20}})
+
+    def test_mutations_run_in_a_worker_thread(self):
+        status, body = self.post('mutation { createProduct(name: "Async", price: 1.5) { product { name } } }')
+        self.assertEqual(body['data']['createProduct']['product']['name'], "Async")
+        self.assertTrue(Product.objects.filter(name="Async").exists())
+
+    def test_async_loader_batches_concurrent_loads(self):
+        loaders = Loaders(AsyncDataLoader)
+        ids = list(Customer.objects.values_list('pk', flat=True))
+
+        async def load_all():
+            return await asyncio.gather(*(loaders.customer_by_id.load(pk) for pk in ids))
+
+        with CaptureQueriesContext(connection) as ctx:
+            customers = async_to_sync(load_all)()
+        self.assertEqual([c.pk for c in customers], ids)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+
+class TracingTests(CRMTestCase):
+    QUERY = "{ orders(first: 3) { edges { node { id customer { email } } } } }"
+
+    def setUp(self):
+        super().setUp()
+        field_stats.clear()
+        self.view = CRMGraphQLView.as_view(schema=schema)
+
+    def post(self, body):
+        request = RequestFactory().post('/graphql', json.dumps(body), content_type='application/json')
+        return json.loads(self.view(request).content)
+
+    def test_tracing_extension_when_requested(self):
+        body = self.post({"query": self.QUERY, "extensions": {"tracing": True}})
+        tracing = body['extensions']['tracing']
+        self.assertEqual(tracing['version'], 1)
+        resolvers = {tuple(r['path']): r for r in tracing['execution']['resolvers']}
+        orders = resolvers[('orders',)]
+        self.assertEqual(orders['parentType'], "Query")
+        self.assertEqual(orders['sqlCount'], 1)
+        self.assertGreater(orders['duration'], 0)
+        self.assertIn(('orders', 'edges', 0, 'node', 'customer', 'email'), resolvers)
+
+    def test_no_tracing_extension_by_default(self):
+        body = self.post({"query": self.QUERY})
+        self.assertNotIn('tracing', body['extensions'])
+
+    def test_field_stats_endpoint(self):
+        for _ in range(3):
+            self.post({"query": self.QUERY})
+        stats = json.loads(field_stats_view(RequestFactory().get('/graphql/field-stats')).content)
+        self.assertEqual(stats['Query.orders']['calls'], 3)
+        # Only the first call misses the resolver cache.
+        self.assertAlmostEqual(stats['Query.orders']['avg_sql_count'], 1 / 3)
+        self.assertLessEqual(stats['Query.orders']['p50_ms'], stats['Query.orders']['p99_ms'])
+        self.assertEqual(stats['OrderType.customer']['calls'], 9)
+        self.assertNotIn('CustomerType.email', stats)
+
+        text = field_stats_view(RequestFactory().get('/graphql/field-stats', {'format': 'prometheus'})).content.decode()
+        self.assertIn('crm_graphql_field_duration_ms{field="Query.orders",quantile="0.95"}', text)
+
+
+class QueryBudgetTests(TestCase):
+    """SQL and wall-time budgets for every operation in the schema.
+
+    Budgets are set at realistic volume, and list queries are also run at
+    two page sizes: an N+1 shows up as a count that grows with the page.
+    """
+
+    MAX_SECONDS = 2.0
+
+    QUERIES = {
+        'hello': ("{ hello }", 0),
+        'crmStats': ("{ crmStats { customerCount orderCount revenue averageOrderValue } }", 2),
+        'crmStats by day': ("{ crmStats(groupBy: DAY) { groups { key orderCount revenue } } }", 3),
+        'crmStats by week': ("{ crmStats(groupBy: WEEK) { groups { key orderCount revenue } } }", 3),
+        'crmStats by customer': ("{ crmStats(groupBy: CUSTOMER) { groups { key orderCount revenue } } }", 3),
+        'customers': (
+            "query($n: Int) { customers(first: $n) { edges { node { name email phone createdAt"
+            " orderSet { id totalAmount customer { name } products { name price } } } } } }",
+            3,
+        ),
+        'customers filtered': (
+            'query($n: Int) { customers(first: $n, name: "a", phonePattern: "2") { edges { node { email } } } }', 1,
+        ),
+        'customerStats': (
+            "query($n: Int) { customerStats(first: $n) { pageInfo { hasNextPage endCursor }"
+            " edges { node { orderCount totalSpent lastOrderDate customer { name email } } } } }",
+            1,
+        ),
+        'customerStats by order count': (
+            "query($n: Int) { customerStats(first: $n, sortBy: ORDER_COUNT_DESC, orderCount_Gte: 2)"
+            " { edges { node { orderCount customer { email } } } } }",
+            1,
+        ),
+        'products': (
+            "query($n: Int) { products(first: $n) { pageInfo { hasNextPage endCursor }"
+            " edges { cursor node { name price stock orderSet { orderDate customer { email } } } } } }",
+            2,
+        ),
+        'products filtered': (
+            "query($n: Int) { products(first: $n, price_Gte: 50, stock_Lte: 30) { edges { node { name } } } }", 1,
+        ),
+        'orders': (
+            "query($n: Int) { orders(first: $n) { edges { node { id orderDate totalAmount"
+            " customer { name email orderSet { id } } products { name orderSet { id } } } } } }",
+            4,
+        ),
+        'orders filtered': (
+            'query($n: Int) { orders(first: $n, totalAmount_Gte: 100, customerName: "smith", productName: "Laptop")'
+            " { edges { node { id customer { email } } } } }",
+            1,
+        ),
+        'search': (
+            'query($n: Int) { search(query: "smith", first: $n) { score node {'
+            " ... on CustomerType { name email } ... on ProductType { name price } } } }",
+            4,
+        ),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.volume = create_dataset(customers=300, products=40, orders_per_customer=3, seed=16)
+
+    def setUp(self):
+        # Measure the database work, not the resolver cache.
+        patcher = mock.patch.object(resolver_cache, 'backend', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def measure(self, query, **variables):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            result = execute(query, **variables)
+            elapsed = time.perf_counter() - start
+        self.assertIsNone(result.errors)
+        return result.data, len(ctx.captured_queries), elapsed
+
+    def test_query_budgets(self):
+        for name, (query, budget) in self.QUERIES.items():
+            with self.subTest(name):
+                data, queries, elapsed = self.measure(query, n=100)
+                self.assertLessEqual(queries, budget)
+                self.assertLess(elapsed, self.MAX_SECONDS)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for name, (query, _) in self.QUERIES.items():
+            if '$n' not in query:
+                continue
+            with self.subTest(name):
+                _, small, _ = self.measure(query, n=5)
+                data, large, _ = self.measure(query, n=100)
+                self.assertEqual(small, large)
+
+    def test_pages_are_populated(self):
+        data, _, _ = self.measure(self.QUERIES['orders'][0], n=100)
+        self.assertEqual(len(data['orders']['edges']), 100)
+        self.assertTrue(any(edge['node']['products'] for edge in data['orders']['edges']))
+
+    def test_negative_page_size_cannot_offset_an_expensive_sibling(self):
+        query = (
+            "{ a: orders(first: 100) { edges { node { products { orderSet { products { orderSet { id } } } } } } }"
+            " b: customers(first: -100000) { edges { node { id } } } }"
+        )
+        body = json.dumps({"query": query})
+        request = RequestFactory().post('/graphql', body, content_type='application/json')
+        with CaptureQueriesContext(connection) as ctx:
+            response = CRMGraphQLView.as_view(schema=schema)(request)
+        payload = json.loads(response.content)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(payload['errors'][0]['extensions']['code'], "QUERY_TOO_EXPENSIVE")
+        self.assertGreater(payload['errors'][0]['extensions']['cost']['requestedQueryCost'], 5000)
+
+    def test_mutation_budgets(self):
+        customer = Customer.objects.order_by('pk').first()
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:3])
+        Product.objects.filter(pk__in=product_ids).update(stock=1000)
+        mutations = [
+            ('createCustomer', 'mutation { createCustomer(name: "New", email: "new@example.com", phone: "555-010-0000")'
+             ' { customer { id } message } }', {}, 2),
+            ('bulkCreateCustomers', "mutation($input: [CustomerInput]!) { bulkCreateCustomers(input: $input)"
+             " { customers { id } errors } }",
+             {'input': [{'name': f"B{i}", 'email': f"bulk{i}@example.com"} for i in range(200)]}, 6),
+            ('createProduct', 'mutation { createProduct(name: "New", price: 5.5, stock: 3) { product { id } } }', {}, 2),
+            ('createOrder', "mutation($c: ID!, $p: [ID]!) { createOrder(customerId: $c, productIds: $p)"
+             " { order { id totalAmount customer { email } products { name } } } }",
+             # 11 outside a test: the atomic block adds SAVEPOINT/RELEASE inside TestCase's transaction.
+             # Two of those keep CustomerStats current: record_order on insert and add_spent on the m2m add.
+             {'c': customer.pk, 'p': product_ids}, 13),
+            ('bulkCreateOrders', "mutation($input: [OrderInput]!) { bulkCreateOrders(input: $input)"
+             " { orders { id totalAmount customer { email } products { name } } errors } }",
+             # One of them is the batch's stock reservation, whatever the batch size.
+             {'input': [{'customerId': customer.pk, 'productIds': product_ids}] * 200}, 10),
+            ('updateLowStockProducts', "mutation { updateLowStockProducts(threshold: 30, increment: 5)"
+             " { products { name stock } updatedProducts } }", {}, 3),
+        ]
+        for name, mutation, variables, budget in mutations:
+            with self.subTest(name):
+                data, queries, elapsed = self.measure(mutation, **variables)
+                self.assertNotIn("Insufficient stock", str(data))
+                self.assertLessEqual(queries, budget)
+                self.assertLess(elapsed, self.MAX_SECONDS)
+
+
+class GenerateDataTests(TestCase):
+    def test_command_generates_consistent_data(self):
+        out = StringIO()
+        call_command('generate_crm_data', customers=60, products=8, orders_per_customer=2, chunk_size=25, stdout=out)
+        self.assertIn("Created 60 customers, 8 products", out.getvalue())
+        self.assertEqual(Customer.objects.count(), 60)
+        self.assertTrue(all(validate_phone(phone) for phone in Customer.objects.values_list('phone', flat=True)))
+        for order in Order.objects.annotate(linked=Sum('products__price')):
+            self.assertEqual(order.total_amount, order.linked)
+            self.assertTrue(1 <= order.products.count() <= 3)
+        spent = Order.objects.aggregate(n=Count('id'), total=Sum('total_amount'))
+        summed = CustomerStats.objects.aggregate(n=Sum('order_count'), total=Sum('total_spent'))
+        self.assertEqual(summed, spent)
+
+    def test_reruns_do_not_collide(self):
+        for _ in range(2):
+            call_command('generate_crm_data', customers=10, products=50, stdout=StringIO())
+        self.assertEqual(Customer.objects.count(), 20)
+        self.assertEqual(Product.objects.count(), 100)
+
+    def test_reruns_after_deletes_do_not_collide(self):
+        call_command('generate_crm_data', customers=10, products=50, stdout=StringIO())
+        Customer.objects.filter(pk__in=Customer.objects.order_by('pk').values('pk')[:3]).delete()
+        Product.objects.filter(pk__in=Product.objects.order_by('pk').values('pk')[:5]).delete()
+        call_command('generate_crm_data', customers=10, products=50, stdout=StringIO())
+        self.assertEqual(Customer.objects.count(), 17)
+        self.assertEqual(Product.objects.count(), 95)
+
+    def test_chunk_size_must_be_positive(self):
+        for chunk_size in (0, -5):
+            with self.subTest(chunk_size=chunk_size):
+                with self.assertRaisesMessage(CommandError, "--chunk-size must be positive."):
+                    call_command('generate_crm_data', customers=5, chunk_size=chunk_size, stdout=StringIO())
+        self.assertFalse(Customer.objects.exists())
+
+    def test_same_seed_same_data(self):
+        now = timezone.now()
+
+        def generate(offset):
+            totals = create_dataset(customers=20, products=5, seed=7, offset=offset, now=now)
+            phones = Customer.objects.order_by('-pk').values_list('phone', flat=True)[:20]
+            orders = Order.objects.order_by('-pk').values_list('total_amount', 'order_date')[:totals['orders']]
+            return totals, list(phones), list(orders)
+
+        self.assertEqual(generate(0), generate(1000))
+
+    def test_rejects_bad_ranges(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_crm_data', products_per_order=[3, 1], stdout=StringIO())
+
+
+class BenchmarkTests(TestCase):
+    def test_runner_reports_metrics_and_rolls_back(self):
+        results = Runner(iterations=2, warmup=0).run([30], OPERATIONS)
+        self.assertEqual(set(results['30']), {op.name for op in OPERATIONS})
+        orders = results['30']['orders']
+        self.assertEqual(orders['sql_queries'], 2)
+        self.assertGreater(orders['ops_per_sec'], 0)
+        self.assertGreater(orders['peak_memory_kb'], 0)
+        bulk = results['30']['bulkCreateCustomers']
+        self.assertAlmostEqual(bulk['rows_per_sec'], bulk['ops_per_sec'] * 100)
+        self.assertFalse(Customer.objects.exists())
+
+    def test_orders_are_stocked_and_refusals_fail_the_run(self):
+        results = Runner(iterations=40, warmup=5).run([30], [OPERATIONS[0]])
+        self.assertGreater(results['30']['createOrder']['ops_per_sec'], 0)
+
+        customer = Customer.objects.create(name="Bench", email="bench@example.com")
+        products = [Product.objects.create(name=f"Empty {i}", price=Decimal("1.00")) for i in range(3)]
+        context = {'customers': [customer.pk], 'products': [p.pk for p in products]}
+        with self.assertRaisesMessage(RuntimeError, "Insufficient stock"):
+            Runner().post(OPERATIONS[0], context)
+
+    def test_bulk_orders_command_places_every_order(self):
+        out = StringIO()
+        call_command('benchmark_bulk_orders', sizes=[40], stdout=out)
+        self.assertIn("40 orders", out.getvalue())
+        self.assertFalse(Order.objects.exists())
+
+        with mock.patch('crm.management.commands.benchmark_bulk_orders.restock'):
+            with self.assertRaisesMessage(CommandError, "createOrder refused an order: Insufficient stock"):
+                call_command('benchmark_bulk_orders', sizes=[5], stdout=StringIO())
+
+        from crm.management.commands.benchmark_bulk_orders import restock
+        # Only the createOrder pass is stocked; the bulk pass finds none left.
+        calls = iter([restock, lambda needed: None])
+        with mock.patch('crm.management.commands.benchmark_bulk_orders.restock', lambda needed: next(calls)(needed)):
+            with self.assertRaisesMessage(CommandError, "bulkCreateOrders placed 0 of 5 orders: Record 1: Insufficient stock"):
+                call_command('benchmark_bulk_orders', sizes=[5], stdout=StringIO())
+        self.assertFalse(Order.objects.exists())
+
+    def test_compare_flags_regressions_in_the_right_direction(self):
+        baseline = {'100': {'orders': {'ops_per_sec': 100.0, 'p95_ms': 10.0, 'sql_queries': 2}}}
+        current = {'100': {'orders': {'ops_per_sec': 80.0, 'p95_ms': 9.0, 'sql_queries': 3}}, '500': {}}
+        rows = {metric: regressed for _, _, metric, _, _, _, regressed in compare(current, baseline)}
+        self.assertEqual(rows, {'ops_per_sec': True, 'p95_ms': False, 'sql_queries': True})
+
+
+class ExportTests(CRMTestCase):
+    def request(self, path='/', params=None, user=None):
+        request = RequestFactory().get(path, params or {})
+        request.user = user or User(username="staff", is_staff=True)
+        return request
+
+    def stream(self, kind, fmt, **params):
+        response = export_view(self.request(f'/export/{kind}.{fmt}', params), kind, fmt)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_orders_csv_streams_in_chunks(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response, body = self.stream('orders', 'csv', chunk_size=8)
+        self.assertEqual(response['Content-Type'], "text/csv")
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows[0]['customer_email'], "customer0@example.com")
+        self.assertEqual(rows[0]['product_names'], "Product 0;Product 1")
+        self.assertEqual(rows[0]['total_amount'], "20.00")
+        # One orders query plus one link-table query per chunk of 8.
+        self.assertEqual(len(ctx.captured_queries), 1 + 3)
+
+    def test_order_filters_apply(self):
+        _, body = self.stream('orders', 'ndjson', customer_name="Customer 3", product_name="Product 2")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['customer_name'], "Customer 3")
+        self.assertEqual(rows[0]['total_amount'], "20.00")
+
+    def test_customers_export(self):
+        _, body = self.stream('customers', 'ndjson', email="customer1")
+        row = json.loads(body.splitlines()[0])
+        self.assertEqual((row['order_count'], row['total_spent']), (2, "40.00"))
+
+    def test_invalid_requests(self):
+        self.assertEqual(export_view(self.request(), 'invoices', 'csv').status_code, 400)
+        request = self.request(params={'total_amount__gte': "lots"})
+        self.assertEqual(export_view(request, 'orders', 'csv').status_code, 400)
+        response = export_view(self.request(params={'chunk_size': "x"}), 'orders', 'csv')
+        self.assertEqual(json.loads(response.content), {"error": "chunk_size must be a positive integer."})
+
+    def test_requires_staff(self):
+        for user in (AnonymousUser(), User(username="customer")):
+            with self.subTest(user=user):
+                self.assertEqual(export_view(self.request(user=user), 'orders', 'csv').status_code, 403)
+
+    def test_command_writes_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'orders.csv')
+        call_command('export_crm', 'orders', '--filter', 'total_amount__gte=20', '-o', path)
+        with open(path, newline='') as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 20)
+
+
+class ImportTests(TestCase):
+    CUSTOMERS = (
+        "name,email,phone\n"
+        "Ann,ann@example.com,123-456-7890\n"
+        "Bob,not-an-email,\n"
+        "Ann Again,ann@example.com,\n"
+        "Cat,cat@example.com,12\n"
+        ",nameless@example.com,\n"
+        "Existing Renamed,existing@example.com,\n"
+    )
+
+    def setUp(self):
+        Customer.objects.create(name="Existing", email="existing@example.com", phone="555-555-5555")
+
+    def run_import(self, kind, text, **kwargs):
+        rejects = StringIO()
+        stats = list(import_csv(kind, StringIO(text), rejects, **kwargs))
+        return stats, list(csv.DictReader(StringIO(rejects.getvalue())))
+
+    def test_customers_upsert_and_reject(self):
+        stats, rejects = self.run_import('customers', self.CUSTOMERS, chunk_size=4)
+        self.assertEqual([s['rows'] for s in stats], [4, 2])
+        self.assertEqual(sum(s['created'] for s in stats), 1)
+        self.assertEqual(sum(s['updated'] for s in stats), 1)
+        self.assertEqual(
+            [(r['line'], r['error']) for r in rejects],
+            [("3", "Invalid email format."), ("4", "Duplicate email in file."),
+             ("5", "Invalid phone format."), ("6", "Name is required.")],
+        )
+        self.assertEqual(Customer.objects.get(email="ann@example.com").name, "Ann")
+        existing = Customer.objects.get(email="existing@example.com")
+        self.assertEqual((existing.name, existing.phone), ("Existing Renamed", None))
+
+    def test_products_upsert_by_name(self):
+        Product.objects.create(name="Mouse", price=Decimal("29.99"), stock=50)
+        text = "name,price,stock\nMouse,24.5,40\nDesk,150,\nChair,-1,3\nLamp,12,-2\n"
+        stats, rejects = self.run_import('products', text)
+        self.assertEqual((stats[0]['created'], stats[0]['updated'], stats[0]['rejected']), (1, 1, 2))
+        self.assertEqual([r['error'] for r in rejects], ["Price must be positive.", "Stock cannot be negative."])
+        mouse = Product.objects.get(name="Mouse")
+        self.assertEqual((mouse.price, mouse.stock), (Decimal("24.50"), 40))
+        self.assertEqual(Product.objects.get(name="Desk").stock, 0)
+
+        result = execute('mutation { createProduct(name: "Desk", price: 99) { product { id } message } }')
+        self.assertEqual(result.data['createProduct']['message'], "Product already exists.")
+
+    def test_dry_run_writes_nothing(self):
+        stats, _ = self.run_import('customers', self.CUSTOMERS, dry_run=True)
+        self.assertEqual((stats[0]['created'], stats[0]['updated']), (1, 1))
+        self.assertFalse(Customer.objects.filter(email="ann@example.com").exists())
+        self.assertEqual(Customer.objects.get(email="existing@example.com").name, "Existing")
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'customers.csv')
+        with open(path, 'w') as f:
+            f.write(self.CUSTOMERS)
+        out = StringIO()
+        call_command('import_crm', 'customers', path, '--chunk-size', '2', stdout=out)
+        self.assertIn("rows/s", out.getvalue())
+        self.assertIn("1 created, 1 updated, 4 rejected", out.getvalue())
+        with open(f"{path}.rejects.csv", newline='') as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 4)
+
+        with open(path, 'w') as f:
+            f.write("name,phone\nAnn,\n")
+        with self.assertRaisesMessage(CommandError, "Missing columns: email"):
+            call_command('import_crm', 'customers', path, stdout=StringIO())
+
+
+class CleanInactiveCustomersTests(TestCase):
+    def setUp(self):
+        old = timezone.now() - timedelta(days=400)
+        product = Product.objects.create(name="P", price=Decimal("1.00"))
+        for i in range(5):
+            Customer.objects.create(name=f"Old {i}", email=f"old{i}@example.com")
+        buyer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        Order.objects.create(customer=buyer).products.add(product)
+        Customer.objects.update(created_at=old)
+        Customer.objects.create(name="New", email="new@example.com")
+
+    def test_deletes_old_customers_without_orders(self):
+        out = StringIO()
+        call_command('clean_inactive_customers', '--batch-size', '2', '-v', '2', stdout=out)
+        self.assertEqual(
+            sorted(Customer.objects.values_list('name', flat=True)), ["Buyer", "New"]
+        )
+        self.assertIn("Deleted 5 inactive customers", out.getvalue())
+        self.assertEqual(out.getvalue().count("Scanned ids"), 3)
+
+    def test_orders_are_checked_by_the_delete_itself(self):
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('clean_inactive_customers', stdout=StringIO())
+        deletes = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('DELETE')]
+        # One statement carries the no-orders check; nothing cascades to orders.
+        self.assertEqual(len(deletes), 1)
+        self.assertIn('DELETE FROM "crm_customer"', deletes[0])
+        self.assertIn('NOT EXISTS', deletes[0])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_order_placed_during_cleanup_keeps_its_customer(self):
+        from crm.management.commands import clean_inactive_customers
+        late = Customer.objects.get(name="Old 0")
+
+        def order_then_delete(batch):
+            Order.objects.create(customer=late)
+            return delete_inactive(batch)
+
+        delete_inactive = clean_inactive_customers.delete_inactive
+        with mock.patch.object(clean_inactive_customers, 'delete_inactive', order_then_delete):
+            call_command('clean_inactive_customers', '--batch-size', '100', stdout=StringIO())
+        self.assertTrue(Customer.objects.filter(pk=late.pk).exists())
+        self.assertEqual(Order.objects.filter(customer=late).count(), 1)
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('clean_inactive_customers', '--dry-run', stdout=out)
+        self.assertIn("Would delete 5 inactive customers", out.getvalue())
+        self.assertEqual(Customer.objects.count(), 7)
+
+
+class OrderReminderTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        product = Product.objects.create(name="P", price=Decimal("1.00"))
+        self.customers = [Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com") for i in range(3)]
+        # c0 has three recent orders, c1 and c2 one each, plus one too old to remind
+        for customer, days in [(0, 1), (0, 2), (0, 3), (1, 1), (2, 6), (2, 30)]:
+            order = Order.objects.create(customer=self.customers[customer], order_date=now - timedelta(days=days))
+            order.products.add(product)
+        self.log_file = os.path.join(tempfile.mkdtemp(), 'reminders.log')
+
+    def test_enqueue_is_idempotent(self):
+        self.assertEqual(enqueue_reminders(chunk_size=2), 5)
+        self.assertEqual(enqueue_reminders(chunk_size=2), 0)
+        self.assertEqual(OrderReminder.objects.count(), 5)
+
+    def test_enqueue_counts_only_new_reminders(self):
+        self.assertEqual(enqueue_reminders(days=4), 4)
+        # Every chunk mixes queued and new orders; the unique key drops the queued ones.
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(enqueue_reminders(chunk_size=2), 1)
+        self.assertFalse([q for q in ctx.captured_queries if 'WHERE "crm_orderreminder"."idempotency_key"' in q['sql']])
+        self.assertEqual(OrderReminder.objects.count(), 5)
+
+    def test_batches_keep_customers_together(self):
+        enqueue_reminders()
+        batches = list(pending_batches(batch_size=2, chunk_size=2))
+        owners = [
+            sorted(set(OrderReminder.objects.filter(pk__in=ids).values_list('customer__email', flat=True)))
+            for ids in batches
+        ]
+        self.assertEqual([len(ids) for ids in batches], [3, 2])
+        self.assertEqual(owners, [["c0@example.com"], ["c1@example.com", "c2@example.com"]])
+
+    def test_queue_and_send_once(self):
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', eager)
+        with override_settings(CRM_REMINDERS={'BATCH_SIZE': 2, 'LOG_FILE': self.log_file}):
+            self.assertEqual(queue_order_reminders(), (5, 2))
+            self.assertEqual(queue_order_reminders(), (0, 0))
+        with open(self.log_file) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        c0 = [line for line in lines if "c0@example.com" in line][0]
+        self.assertEqual(c0.count(","), 3)
+        self.assertFalse(OrderReminder.objects.filter(status=OrderReminder.PENDING).exists())
+
+
+class CustomerStatsTests(CRMTestCase):
+    def assertStatsMatchOrders(self):
+        expected = {
+            row['customer_id']: row for row in Order.objects.values('customer_id').annotate(
+                order_count=Count('id'), total_spent=Sum('total_amount'),
+                first_order_date=Min('order_date'), last_order_date=Max('order_date'),
+            ).order_by()
+        }
+        actual = {row['customer_id']: row for row in CustomerStats.objects.values()}
+        self.assertEqual(actual, expected)
+
+    def test_maintained_incrementally(self):
+        self.assertStatsMatchOrders()
+        customer = Customer.objects.get(email="customer0@example.com")
+        products = list(Product.objects.order_by('id'))
+        order = Order.objects.create(customer=customer, order_date=timezone.now() - timedelta(days=30))
+        order.products.add(*products[:3])
+        self.assertEqual(CustomerStats.objects.get(pk=customer.pk).total_spent, Decimal("70.00"))
+        order.products.remove(products[0])
+        products[4].order_set.add(*Order.objects.filter(customer__email="customer1@example.com"))
+        self.assertStatsMatchOrders()
+
+        order.customer = Customer.objects.get(email="customer2@example.com")
+        order.save()
+        self.assertStatsMatchOrders()
+        Order.objects.filter(customer__email="customer1@example.com").delete()
+        self.assertFalse(CustomerStats.objects.filter(customer__email="customer1@example.com").exists())
+        self.assertStatsMatchOrders()
+
+    def test_rebuild(self):
+        CustomerStats.objects.filter(customer__email="customer0@example.com").update(order_count=99)
+        CustomerStats.objects.filter(customer__email="customer1@example.com").delete()
+        Customer.objects.filter(email="customer2@example.com").first().order_set.all().delete()
+        out = StringIO()
+        call_command('rebuild_customer_stats', '--batch-size', '3', stdout=out)
+        self.assertIn("Done: 9 customer summaries rebuilt.", out.getvalue())
+        self.assertStatsMatchOrders()
+
+    def test_sorted_and_filtered_from_one_table(self):
+        order = Order.objects.filter(customer__email="customer3@example.com").first()
+        order.products.add(Product.objects.get(name="Product 4"))
+        Customer.objects.create(name="Idle", email="idle@example.com")
+        query = """{
+          customerStats(first: 2, sortBy: TOTAL_SPENT_DESC, orderCount_Gte: 2) {
+            edges { node { orderCount totalSpent customer { email } } }
+          }
+          customers(hasOrders: false) { edges { node { email stats { orderCount } } } }
+        }"""
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(query)
+        self.assertIsNone(result.errors)
+        top = nodes(result.data, 'customerStats')
+        self.assertEqual(top[0], {'orderCount': 2, 'totalSpent': "50.00", 'customer': {'email': "customer3@example.com"}})
+        self.assertEqual(top[1]['totalSpent'], "40.00")
+        self.assertEqual(nodes(result.data, 'customers'), [{'email': "idle@example.com", 'stats': None}])
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertNotIn('"crm_order"', ctx.captured_queries[0]['sql'])
+
+
+class SearchTests(CRMTestCase):
+    def test_contains_matches_icontains(self):
+        Customer.objects.filter(email="customer1@example.com").update(name="Renamed Person")
+        Customer.objects.bulk_create([Customer(name="Bulk 100%", email="bulk_one@example.com")])
+        Customer.objects.filter(email="customer2@example.com").delete()
+        Product.objects.create(name="Widget Deluxe", price=Decimal("1.00"))
+        cases = [
+            (Customer, 'name', ['ustomer 1', 'CUSTOMER', 'renamed', 'r', '100%', 'Customer 2']),
+            (Customer, 'email', ['omer3@', 'k_o', 'customer2@']),
+            (Product, 'name', ['widget', 'DUCT 4', 'zzz']),
+        ]
+        for model, field, values in cases:
+            for value in values:
+                with self.subTest(field=field, value=value):
+                    self.assertEqual(
+                        set(search.contains(model.objects.all(), field, value).values_list('pk', flat=True)),
+                        set(model.objects.filter(**{f'{field}__icontains': value}).values_list('pk', flat=True)),
+                    )
+
+    def test_filters_use_trigram_index(self):
+        if not search.indexed(Customer):
+            self.skipTest("needs SQLite FTS5 with the trigram tokenizer")
+        filterset = CustomerFilter({'email': 'omer3@'}, queryset=Customer.objects.all())
+        self.assertTrue(filterset.is_valid())
+        self.assertIn("VIRTUAL TABLE INDEX 0:L", filterset.qs.explain())
+        self.assertEqual([c.email for c in filterset.qs], ["customer3@example.com"])
+
+    def test_search_is_ranked(self):
+        Customer.objects.create(name="Ada Lovelace", email="ada@example.com")
+        Customer.objects.create(name="Bob", email="lovelace.fan@example.com")
+        Product.objects.create(name="Lovelace Notes", price=Decimal("5.00"))
+        query = """query($q: String!, $kinds: [SearchKind!]) {
+          search(query: $q, first: 5, kinds: $kinds) {
+            score node { ... on CustomerType { email orderSet { id } } ... on ProductType { name } }
+          }
+        }"""
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(query, q="lovelace", kinds=["CUSTOMER"])
+        self.assertIsNone(result.errors)
+        hits = result.data['search']
+        self.assertEqual([hit['node']['email'] for hit in hits], ["ada@example.com", "lovelace.fan@example.com"])
+        self.assertGreaterEqual(hits[0]['score'], hits[1]['score'])
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+
+        result = execute(query, q="LOVELACE not")
+        self.assertEqual(result.data['search'], [{'score': mock.ANY, 'node': {'name': "Lovelace Notes"}}])
+        result = execute(query, q="du 3", kinds=["PRODUCT"])
+        self.assertEqual([hit['node']['name'] for hit in result.data['search']], ["Product 3"])
+
+    def test_install_restores_dropped_triggers(self):
+        if not search.indexed(Product):
+            self.skipTest("needs SQLite FTS5 with the trigram tokenizer")
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER crm_product_fts_insert")
+        Product.objects.create(name="Unindexed Gadget", price=Decimal("1.00"))
+        self.assertEqual(search.search("gadget"), [])
+        search.install()
+        Product.objects.create(name="Indexed Gadget", price=Decimal("1.00"))
+        self.assertEqual(sorted(p.name for _, p in search.search("gadget")), ["Indexed Gadget", "Unindexed Gadget"])
+
+
+class StockReservationTests(CRMTestCase):
+    MUTATION = """mutation($c: ID!, $p: [ID]!) {
+      createOrder(customerId: $c, productIds: $p) { order { id } message }
+    }"""
+
+    def test_order_takes_stock_all_or_nothing(self):
+        customer = Customer.objects.first()
+        low, plenty = Product.objects.order_by('pk')[:2]
+        Product.objects.filter(pk=low.pk).update(stock=1)
+        result = execute(self.MUTATION, c=customer.pk, p=[low.pk, plenty.pk])
+        self.assertIsNotNone(result.data['createOrder']['order'])
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[low.pk, plenty.pk]).order_by('pk').values_list('stock', flat=True)),
+            [0, 4],
+        )
+        orders = Order.objects.count()
+        result = execute(self.MUTATION, c=customer.pk, p=[low.pk, plenty.pk])
+        self.assertEqual(result.data['createOrder'], {'order': None, 'message': "Insufficient stock for Product 0."})
+        self.assertEqual(Product.objects.get(pk=plenty.pk).stock, 4)
+        self.assertEqual(Order.objects.count(), orders)
+
+    def test_repeated_products_count_once_in_both_mutations(self):
+        customer = Customer.objects.first()
+        single, other = Product.objects.order_by('pk')[:2]
+        bulk = "mutation($input: [OrderInput]!) { bulkCreateOrders(input: $input) { orders { id } errors } }"
+        for name, run in [
+            ('createOrder', lambda ids: execute(self.MUTATION, c=customer.pk, p=ids).data['createOrder']['order']),
+            ('bulkCreateOrders', lambda ids: execute(bulk, input=[{'customerId': customer.pk, 'productIds': ids}])
+             .data['bulkCreateOrders']['orders'][0]),
+        ]:
+            with self.subTest(name):
+                Product.objects.filter(pk=single.pk).update(stock=1)
+                order = run([single.pk, str(single.pk), other.pk, single.pk])
+                self.assertIsNotNone(order)
+                order = Order.objects.get(pk=order['id'])
+                self.assertEqual(sorted(order.products.values_list('pk', flat=True)), [single.pk, other.pk])
+                self.assertEqual(order.total_amount, single.price + other.price)
+                self.assertEqual(Product.objects.get(pk=single.pk).stock, 0)
+        self.assertEqual(Product.objects.get(pk=other.pk).stock, 3)
+
+
+class StockReservationStressTests(TransactionTestCase):
+    THREADS = 16
+    ORDERS_PER_THREAD = 10
+    MAX_SECONDS = 60
+
+    def place_order(self, customer, product_ids, deadline):
+        while True:
+            result = execute(StockReservationTests.MUTATION, c=customer.pk, p=product_ids)
+            if not result.errors:
+                return result.data['createOrder']['message']
+            # SQLite's shared-cache test database refuses a second writer
+            # instead of waiting; the rolled-back attempt is retried until the deadline.
+            if "table is locked" not in str(result.errors[0]):
+                return str(result.errors[0])
+            if time.monotonic() > deadline:
+                return "Retries ran out."
+            time.sleep(0.001)
+
+    def test_no_oversell_under_concurrency(self):
+        products = [Product.objects.create(name=f"Scarce {i}", price=Decimal("1.00"), stock=25) for i in range(3)]
+        customer = Customer.objects.create(name="Racer", email="racer@example.com")
+        barrier = threading.Barrier(self.THREADS)
+        deadline = time.monotonic() + self.MAX_SECONDS
+        outcomes = []
+
+        def place_orders(seed):
+            try:
+                barrier.wait()
+                for i in range(self.ORDERS_PER_THREAD):
+                    # Overlapping product pairs, so reservations contend on every row.
+                    chosen = [products[(seed + i) % 3].pk, products[(seed + i + 1) % 3].pk]
+                    outcomes.append(self.place_order(customer, chosen, deadline))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=place_orders, args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(outcomes), self.THREADS * self.ORDERS_PER_THREAD)
+        self.assertNotIn("Retries ran out.", outcomes)
+        placed = outcomes.count("Order created successfully.")
+        rejected = sum(message.startswith("Insufficient stock") for message in outcomes)
+        self.assertEqual(placed + rejected, len(outcomes), set(outcomes))
+        self.assertEqual(Order.objects.count(), placed)
+        for product in Product.objects.filter(pk__in=[p.pk for p in products]):
+            self.assertGreaterEqual(product.stock, 0)
+            self.assertEqual(product.stock + product.order_set.count(), 25)
+        # 75 units at two per order: at most 37 orders fit.
+        self.assertLessEqual(placed, 37)
+        self.assertGreater(rejected, 0)
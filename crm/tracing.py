@@ -0,0 +1,174 @@
+"""
+Per-resolver tracing.
+
+``TracingMiddleware`` times each resolver call and counts the SQL it runs
+through ``connection.execute_wrapper``. Two consumers:
+
+* Requests that send ``extensions: {"tracing": true}`` get an
+  Apollo-tracing-compatible ``extensions.tracing`` block covering every
+  field, with ``sqlCount``/``sqlDuration`` added to each resolver entry.
+* Root fields and fields returning objects or lists (the only ones that
+  can reach the database) feed ``field_stats``, a rolling window of the
+  last ``CRM_TRACING_WINDOW`` samples per field served as p50/p95/p99 by
+  the ``graphql/field-stats`` endpoint.
+
+Durations of async resolvers (the ASGI view) are measured until their
+awaitable completes; their SQL runs in a worker thread and is not
+attributed.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from inspect import isawaitable
+
+from django.conf import settings
+from django.db import connection
+from graphql import get_named_type, is_leaf_type
+
+
+class SQLCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter_ns()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter_ns() - start
+
+
+class Tracer:
+    """Apollo tracing data for one operation."""
+
+    def __init__(self):
+        self.start_time = datetime.now(timezone.utc)
+        self.start = time.perf_counter_ns()
+        self.resolvers = []
+
+    def add(self, info, start, duration, sql):
+        self.resolvers.append({
+            'path': info.path.as_list(),
+            'parentType': info.parent_type.name,
+            'fieldName': info.field_name,
+            'returnType': str(info.return_type),
+            'startOffset': start - self.start,
+            'duration': duration,
+            'sqlCount': sql.count,
+            'sqlDuration': sql.duration,
+        })
+
+    def as_extension(self):
+        duration = time.perf_counter_ns() - self.start
+        end_time = self.start_time.timestamp() + duration / 1e9
+        return {
+            'version': 1,
+            'startTime': _iso(self.start_time),
+            'endTime': _iso(datetime.fromtimestamp(end_time, timezone.utc)),
+            'duration': duration,
+            'execution': {'resolvers': self.resolvers},
+        }
+
+
+def _iso(moment):
+    return moment.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class FieldStats:
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._calls = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, field, duration, sql):
+        with self._lock:
+            self._samples[field].append((duration, sql.count, sql.duration))
+            self._calls[field] += 1
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._calls.clear()
+
+    def snapshot(self):
+        """Per-field call count and rolling-window percentiles, in milliseconds."""
+        with self._lock:
+            samples = {field: list(window) for field, window in self._samples.items()}
+            calls = dict(self._calls)
+        stats = {}
+        for field, window in sorted(samples.items()):
+            durations = [duration / 1e6 for duration, _, _ in window]
+            stats[field] = {
+                'calls': calls[field],
+                'window': len(window),
+                'p50_ms': percentile(durations, 50),
+                'p95_ms': percentile(durations, 95),
+                'p99_ms': percentile(durations, 99),
+                'avg_sql_count': sum(count for _, count, _ in window) / len(window),
+                'avg_sql_ms': sum(sql for _, _, sql in window) / len(window) / 1e6,
+            }
+        return stats
+
+
+field_stats = FieldStats(getattr(settings, 'CRM_TRACING_WINDOW', 1000))
+
+
+class TracingMiddleware:
+    def resolve(self, next, root, info, **args):
+        tracer = getattr(info.context, 'crm_tracer', None)
+        aggregate = info.path.prev is None or not is_leaf_type(get_named_type(info.return_type))
+        if tracer is None and not aggregate:
+            return next(root, info, **args)
+
+        sql = SQLCounter()
+        start = time.perf_counter_ns()
+        with connection.execute_wrapper(sql):
+            result = next(root, info, **args)
+        if isawaitable(result):
+            return self.finish_async(result, info, tracer, aggregate, start, sql)
+        self.finish(info, tracer, aggregate, start, sql)
+        return result
+
+    async def finish_async(self, result, info, tracer, aggregate, start, sql):
+        try:
+            return await result
+        finally:
+            self.finish(info, tracer, aggregate, start, sql)
+
+    def finish(self, info, tracer, aggregate, start, sql):
+        duration = time.perf_counter_ns() - start
+        if tracer is not None:
+            tracer.add(info, start, duration, sql)
+        if aggregate:
+            field_stats.record(f"{info.parent_type.name}.{info.field_name}", duration, sql)
+
+
+def tracing_requested(extensions):
+    return bool((extensions or {}).get('tracing'))
+
+
+def prometheus_text(stats):
+    lines = [
+        "# HELP crm_graphql_field_duration_ms Resolver duration over the rolling window.",
+        "# TYPE crm_graphql_field_duration_ms summary",
+    ]
+    for field, values in stats.items():
+        for quantile, key in (("0.5", 'p50_ms'), ("0.95", 'p95_ms'), ("0.99", 'p99_ms')):
+            lines.append(f'crm_graphql_field_duration_ms{{field="{field}",quantile="{quantile}"}} {values[key]}')
+        lines.append(f'crm_graphql_field_duration_ms_count{{field="{field}"}} {values["calls"]}')
+    lines += [
+        "# HELP crm_graphql_field_sql_queries Average SQL queries per resolver call.",
+        "# TYPE crm_graphql_field_sql_queries gauge",
+    ]
+    for field, values in stats.items():
+        lines.append(f'crm_graphql_field_sql_queries{{field="{field}"}} {values["avg_sql_count"]}')
+    return "\n".join(lines) + "\n"
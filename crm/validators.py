@@ -0,0 +1,9 @@
+import re
+
+PHONE_PATTERN = re.compile(r'^(\+?\d{1,3}[- ]?)?(\d{3}[- ]?\d{3}[- ]?\d{4})$')
+
+# Validation helper for phone
+def validate_phone(phone):
+    if phone is None:
+        return True
+    return PHONE_PATTERN.match(phone)
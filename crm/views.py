@@ -1,3 +1,279 @@
-from django.shortcuts import render
+import json
+from inspect import isawaitable
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, validate_schema
+
+from .cost import QueryTooExpensive, check_query_cost
+from .export import CHUNK_SIZE as EXPORT_CHUNK_SIZE, FORMATS, ExportError, export
+from .documents import (
+    PersistedQueryError,
+    document_cache,
+    get_document,
+    resolve_persisted_query,
+)
+from .tracing import Tracer, field_stats, prometheus_text, tracing_requested
+
+
+class CRMGraphQLView(GraphQLView):
+    """GraphQLView with persisted queries, a parsed-document cache, query cost limits,
+    resolver tracing and response extensions."""
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        extensions = self.get_extensions(request, data)
+        try:
+            query = resolve_persisted_query(query, extensions)
+        except PersistedQueryError as e:
+            error = {"message": str(e), "extensions": {"code": e.code}}
+            return self.json_encode(request, {"errors": [error]}), 200
+        request.crm_tracer = Tracer() if tracing_requested(extensions) else None
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.format_response(request, execution_result, id, show_graphiql)
+
+    def format_response(self, request, execution_result, id=None, show_graphiql=False):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        if not execution_result:
+            return None, 200
+
+        tracer = getattr(request, "crm_tracer", None)
+        if tracer is not None:
+            execution_result.extensions = {**(execution_result.extensions or {}), "tracing": tracer.as_extension()}
+
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            set_rollback()
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(not getattr(e, "path", None) for e in execution_result.errors):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+
+        if execution_result.extensions:
+            response["extensions"] = execution_result.extensions
+
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+    @staticmethod
+    def get_extensions(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return extensions
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        prepared = self.prepare_request(request, query, variables, operation_name, show_graphiql)
+        if not isinstance(prepared, tuple):
+            return prepared
+        return self.execute_prepared(request, variables, operation_name, *prepared)
+
+    def prepare_request(self, request, query, variables, operation_name, show_graphiql=False):
+        """Return ``(document, operation_ast, cost)``, or the result to send instead."""
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        # Known documents skip parse() and validate() entirely
+        document, errors = get_document(
+            schema, query, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS
+        )
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        # Page sizes come from variables, so cost is checked per request
+        # rather than as part of the cached validation.
+        try:
+            cost = check_query_cost(schema, document, operation_name, variables)
+        except QueryTooExpensive as e:
+            return ExecutionResult(data=None, errors=[e])
+        return document, operation_ast, cost
+
+    def execute_options(self, request, variables, operation_name):
+        options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            options["execution_context_class"] = self.execution_context_class
+        return options
+
+    def execute_prepared(self, request, variables, operation_name, document, operation_ast, cost):
+        schema = self.schema.graphql_schema
+        try:
+            execute_options = self.execute_options(request, variables, operation_name)
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+            else:
+                result = execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+        return add_cost(result, cost)
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """CRMGraphQLView for ASGI: queries execute on the event loop.
+
+    The connection fields fetch pages with async queryset iteration, nested
+    relations go through async DataLoaders and other database-bound
+    resolvers run in a worker thread, so a request waiting on the database
+    does not hold a thread. Mutations, batches and GraphiQL keep their sync
+    code paths (transactions, templates) and run in a worker thread.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        sync_dispatch = sync_to_async(super().dispatch)
+        if self.batch or request.method.lower() not in ("get", "post"):
+            return await sync_dispatch(request, *args, **kwargs)
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_dispatch(request, *args, **kwargs)
+            result, status_code = await self.aget_response(request, data)
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def aget_response(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        extensions = self.get_extensions(request, data)
+        try:
+            if extensions:
+                # The registry lives in the Django cache, which may block.
+                query = await sync_to_async(resolve_persisted_query)(query, extensions)
+        except PersistedQueryError as e:
+            error = {"message": str(e), "extensions": {"code": e.code}}
+            return self.json_encode(request, {"errors": [error]}), 200
+        request.crm_tracer = Tracer() if tracing_requested(extensions) else None
+
+        prepared = self.prepare_request(request, query, variables, operation_name)
+        if not isinstance(prepared, tuple):
+            execution_result = prepared
+        elif prepared[1] is not None and prepared[1].operation == OperationType.QUERY:
+            execution_result = await self.aexecute_prepared(request, variables, operation_name, *prepared)
+        else:
+            execution_result = await sync_to_async(self.execute_prepared)(
+                request, variables, operation_name, *prepared
+            )
+        return self.format_response(request, execution_result, id)
+
+    async def aexecute_prepared(self, request, variables, operation_name, document, operation_ast, cost):
+        try:
+            result = execute(
+                self.schema.graphql_schema, document, **self.execute_options(request, variables, operation_name)
+            )
+            if isawaitable(result):
+                result = await result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        return add_cost(result, cost)
+
+
+def add_cost(result, cost):
+    if cost is not None:
+        result.extensions = {**(result.extensions or {}), "cost": cost}
+    return result
+
+
+def document_cache_stats(request):
+    return JsonResponse(document_cache.stats())
+
+
+def field_stats_view(request):
+    stats = field_stats.snapshot()
+    if request.GET.get("format") == "prometheus":
+        return HttpResponse(prometheus_text(stats), content_type="text/plain; version=0.0.4")
+    return JsonResponse(stats)
+
+
+def export_view(request, kind, fmt):
+    """Stream the ``kind`` export as ``fmt`` to staff users; query parameters are filters."""
+    # Exports carry every customer's name and email.
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff access required."}, status=403)
+    filters = request.GET.copy()
+    try:
+        chunk_size = int(filters.pop("chunk_size", [EXPORT_CHUNK_SIZE])[-1])
+    except ValueError:
+        return JsonResponse({"error": "chunk_size must be a positive integer."}, status=400)
+    try:
+        lines = export(kind, fmt, filters, chunk_size)
+    except ExportError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    response = StreamingHttpResponse(lines, content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+    return response
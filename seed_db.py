@@ -1,13 +1,15 @@
 #!/usr/bin/env python
 """
 Seed script to populate the database with sample data
+
+For benchmark-sized data use ``python manage.py generate_crm_data``.
 """
 import os
 import sys
 import django
 
 # Setup Django
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
 django.setup()
 
 from crm.models import Customer, Product, Order